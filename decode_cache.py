@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+class DecodeCache:
+    """
+    Bounded least recently used cache of decoded sequences.
+    Keys are (namespace, tuple of words) tuples, where the namespace
+    identifies the decoder and the model fingerprint (see HMMModel.fingerprint),
+    so one cache can be shared by several decoders and models.
+    Values are shared between hits, so decoders store immutable values.
+    hits and misses count the lookups since the cache was created or cleared
+    """
+
+    def __init__(self, max_size=1 << 16):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """
+        Returns the value of a key, or None if it is not cached
+        """
+
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def memoize(self, namespace, decode):
+        """
+        Returns a function that decodes a sequence of words with decode,
+        unless it was already decoded in the same namespace
+        """
+
+        def cached_decode(sequence):
+            key = (namespace, tuple(sequence))
+            value = self.get(key)
+            if value is None:
+                value = decode(sequence)
+                self.put(key, value)
+            return value
+
+        return cached_decode
+
+    def decode_all(self, namespace, sequences, batch_decode):
+        """
+        Returns the decoded values of a list of sequences of words,
+        calling batch_decode once with the list of distinct sequences
+        that are not cached. Repeats of a sequence within the list count as hits
+        """
+
+        values = [None] * len(sequences)
+        pending = OrderedDict()
+        for i, sequence in enumerate(sequences):
+            key = (namespace, tuple(sequence))
+            if key in pending:
+                self.hits += 1
+                pending[key].append(i)
+                continue
+            values[i] = self.get(key)
+            if values[i] is None:
+                pending[key] = [i]
+
+        if pending:
+            decoded = batch_decode([list(key[1]) for key in pending])
+            for (key, indices), value in zip(pending.items(), decoded):
+                self.put(key, value)
+                for i in indices:
+                    values[i] = value
+
+        return values
@@ -1,11 +1,11 @@
-import sys
-import re
-from copy import copy
 from collections import defaultdict
-from optparse import OptionParser
+from argparse import ArgumentParser
+from evaluation import evaluate_all, write_results_json, write_results_csv
 
 #Read entities from predcition
-def get_predicted(predicted, answers=defaultdict(lambda: defaultdict(defaultdict))):
+def get_predicted(predicted, answers=None):
+    if answers is None:
+        answers = defaultdict(lambda: defaultdict(defaultdict))
 
     example = 0
     word_index = 0
@@ -214,295 +214,78 @@ def compare_observed_to_predicted(observed, predicted):
 
 
 
-##############Main Function##################
-
-# if len(sys.argv) < 3:
-#     print ('Please make sure you have installed Python 3.4 or above!')
-#     print ("Usage on Windows:  python evalResult.py gold predictions")
-#     print ("Usage on Linux/Mac:  python3 evalResult.py gold predictions")
-#     sys.exit()
-
-# gold = open(sys.argv[1], "r", encoding='UTF-8')
-# prediction = open(sys.argv[2], "r", encoding='UTF-8')
-
-print("----------------")
-print("---EN P2 DATA---")
-print("----------------")
-gold = open("data/EN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/EN/dev.p2.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---ES P2 DATA---")
-print("----------------")
-gold = open("data/ES/dev.out", "r", encoding='UTF-8')
-prediction = open("data/ES/dev.p2.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---SG P2 DATA---")
-print("----------------")
-
-gold = open("data/SG/dev.out", "r", encoding='UTF-8')
-prediction = open("data/SG/dev.p2.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---CN P2 DATA---")
-print("----------------")
-gold = open("data/CN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/CN/dev.p2.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---EN P3 DATA---")
-print("----------------")
-gold = open("data/EN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/EN/dev.p3.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---ES P3 DATA---")
-print("----------------")
-gold = open("data/ES/dev.out", "r", encoding='UTF-8')
-prediction = open("data/ES/dev.p3.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---SG P3 DATA---")
-print("----------------")
-
-gold = open("data/SG/dev.out", "r", encoding='UTF-8')
-prediction = open("data/SG/dev.p3.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---CN P3 DATA---")
-print("----------------")
-gold = open("data/CN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/CN/dev.p3.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---EN P4 DATA---")
-print("----------------")
-gold = open("data/EN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/EN/dev.p4.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---ES P4 DATA---")
-print("----------------")
-gold = open("data/ES/dev.out", "r", encoding='UTF-8')
-prediction = open("data/ES/dev.p4.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---EN P4 DATA--- (not processed)")
-print("----------------")
-gold = open("data/EN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/EN/dev.p4_notprocessed.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---ES P4 DATA--- (not processed)")
-print("----------------")
-gold = open("data/ES/dev.out", "r", encoding='UTF-8')
-prediction = open("data/ES/dev.p4_notprocessed.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
-
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---EN P5 DATA---")
-print("----------------")
-gold = open("data/EN/dev.out", "r", encoding='UTF-8')
-prediction = open("data/EN/dev.p5.out", "r", encoding='UTF-8')
-
 #column separator
 separator = ' '
 
 #the column index for tags
 outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
-
-#Read Predction data
-predicted = get_predicted(prediction)
-
-#Compare
-compare_observed_to_predicted(observed, predicted)
-
-print("\n----------------")
-print("---ES P5 DATA---")
-print("----------------")
-gold = open("data/ES/dev.out", "r", encoding='UTF-8')
-prediction = open("data/ES/dev.p5.out", "r", encoding='UTF-8')
-
-#column separator
-separator = ' '
 
-#the column index for tags
-outputColumnIndex = 1
-#Read Gold data
-observed = get_observed(gold)
+#Prediction files scored when no file is given, with their titles
+DEFAULT_EVALUATIONS = [
+    ("---EN P2 DATA---", "data/EN/dev.out", "data/EN/dev.p2.out"),
+    ("---ES P2 DATA---", "data/ES/dev.out", "data/ES/dev.p2.out"),
+    ("---SG P2 DATA---", "data/SG/dev.out", "data/SG/dev.p2.out"),
+    ("---CN P2 DATA---", "data/CN/dev.out", "data/CN/dev.p2.out"),
+    ("---EN P3 DATA---", "data/EN/dev.out", "data/EN/dev.p3.out"),
+    ("---ES P3 DATA---", "data/ES/dev.out", "data/ES/dev.p3.out"),
+    ("---SG P3 DATA---", "data/SG/dev.out", "data/SG/dev.p3.out"),
+    ("---CN P3 DATA---", "data/CN/dev.out", "data/CN/dev.p3.out"),
+    ("---EN P4 DATA---", "data/EN/dev.out", "data/EN/dev.p4.out"),
+    ("---ES P4 DATA---", "data/ES/dev.out", "data/ES/dev.p4.out"),
+    ("---EN P4 DATA--- (not processed)", "data/EN/dev.out", "data/EN/dev.p4_notprocessed.out"),
+    ("---ES P4 DATA--- (not processed)", "data/ES/dev.out", "data/ES/dev.p4_notprocessed.out"),
+    ("---EN P5 DATA---", "data/EN/dev.out", "data/EN/dev.p5.out"),
+    ("---ES P5 DATA---", "data/ES/dev.out", "data/ES/dev.p5.out"),
+]
+
+#Print the results of evaluation.scores like compare_observed_to_predicted
+def print_results(results):
+    print()
+    print('#Entity in gold data: %d' % (results['observed']))
+    print('#Entity in prediction: %d' % (results['predicted']))
+    print()
+    printResult('Entity', results['correct_entity'], results['entity_precision'], results['entity_recall'])
+    print()
+    printResult('Sentiment', results['correct_sentiment'], results['sentiment_precision'], results['sentiment_recall'])
 
-#Read Predction data
-predicted = get_predicted(prediction)
+##############Main Function##################
 
-#Compare
-compare_observed_to_predicted(observed, predicted)
\ No newline at end of file
+def main(argv=None):
+    parser = ArgumentParser(description="Scores prediction files against a gold file, or the default prediction files in data if none is given")
+    parser.add_argument('gold', nargs='?', help="gold file")
+    parser.add_argument('predictions', nargs='*', help="prediction files")
+    parser.add_argument('--processes', type=int, default=1, help="number of processes scoring the prediction files")
+    parser.add_argument('--json', help="write the results table to this JSON file instead of printing it")
+    parser.add_argument('--csv', help="write the results table to this CSV file instead of printing it")
+    args = parser.parse_args(argv)
+
+    if args.gold is None:
+        evaluations = DEFAULT_EVALUATIONS
+    elif args.predictions:
+        evaluations = [("---%s---" % prediction_file, args.gold, prediction_file) for prediction_file in args.predictions]
+    else:
+        parser.error("the prediction files are required with a gold file")
+
+    predictions = {}
+    for title, gold_file, prediction_file in evaluations:
+        predictions.setdefault(gold_file, []).append(prediction_file)
+    results = evaluate_all(predictions, args.processes, separator, outputColumnIndex)
+
+    if args.json:
+        write_results_json(results, args.json)
+    if args.csv:
+        write_results_csv(results, args.csv)
+    if args.json or args.csv:
+        return results
+
+    results_by_file = { (row['gold_file'], row['prediction_file']): row for row in results }
+    for i, (title, gold_file, prediction_file) in enumerate(evaluations):
+        print(("\n" if i else "") + "----------------")
+        print(title)
+        print("----------------")
+        print_results(results_by_file[(gold_file, prediction_file)])
+
+    return results
+
+if __name__ == '__main__':
+    main()
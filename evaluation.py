@@ -0,0 +1,387 @@
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from itertools import chain, repeat
+import numpy as np
+
+# Columns of a results table, see evaluate_all
+RESULT_FIELDS = ['gold_file', 'prediction_file', 'observed', 'predicted', 'correct_entity', 'correct_sentiment',
+    'entity_precision', 'entity_recall', 'entity_f', 'sentiment_precision', 'sentiment_recall', 'sentiment_f']
+
+def iter_sentence_spans(lines, separator=' ', column=1):
+    """
+    Takes an iterable of the lines of a file with a tag in the given column
+    (gold data or predictions) and yields, for every sentence, the dict of its
+    entity spans from (begin, length) to sentiment, as soon as the sentence is read.
+    Spans are read the same way as evalResult.get_observed and get_predicted:
+    B, I after O and I with a different sentiment start an entity,
+    and a sentence is yielded for every blank line and at the end of the file
+    """
+
+    spans = {}
+    begin = None
+    length = 0
+    sentiment = None
+    word_index = 0
+    last_ne = "O"
+    last_sent = ""
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith("##"):
+            continue
+        elif len(line) == 0:
+            if begin is not None:
+                spans[(begin, length)] = sentiment
+                begin = None
+            yield spans
+            spans = {}
+            word_index = 0
+            last_ne = "O"
+            continue
+
+        value = line.split(separator)[column]
+        ne = value[0]
+        sent = value[2:]
+
+        if ne == 'B' or (ne == 'I' and (last_ne == 'O' or last_sent != sent)):
+            if begin is not None:
+                spans[(begin, length)] = sentiment
+            begin, length, sentiment = word_index, 1, sent
+        elif ne == 'I':
+            length += 1
+        elif ne == 'O':
+            if begin is not None and (last_ne == 'B' or last_ne == 'I'):
+                spans[(begin, length)] = sentiment
+            begin = None
+
+        last_sent = sent
+        last_ne = ne
+        word_index += 1
+
+    if begin is not None:
+        spans[(begin, length)] = sentiment
+    yield spans
+
+def count_matches(observed_sentences, predicted_sentences):
+    """
+    Takes iterables of the span dicts of every sentence of the gold data and of
+    the predictions, as yielded by iter_sentence_spans, and returns a dict of
+    the number of entities in the gold data and in the predictions, and of the
+    predicted entities with a correct span and with a correct span and sentiment.
+    Sentences are matched in order, predicted sentences past the end of the gold
+    data are ignored and missing ones have no entities, as in
+    evalResult.compare_observed_to_predicted
+    """
+
+    observed = predicted = correct_entity = correct_sentiment = 0
+
+    predicted_sentences = iter(predicted_sentences)
+    for observed_spans in observed_sentences:
+        predicted_spans = next(predicted_sentences, {})
+        observed += len(observed_spans)
+        predicted += len(predicted_spans)
+        for span, sentiment in predicted_spans.items():
+            if span in observed_spans:
+                correct_entity += 1
+                if observed_spans[span] == sentiment:
+                    correct_sentiment += 1
+
+    return {
+        'observed': observed,
+        'predicted': predicted,
+        'correct_entity': correct_entity,
+        'correct_sentiment': correct_sentiment,
+    }
+
+def f_score(precision, recall):
+    if abs(precision + recall) < 1e-6:
+        return 0
+    return 2 * precision * recall / (precision + recall)
+
+def scores(counts):
+    """
+    Takes a dict of counts as returned by count_matches and returns a copy
+    with the precision, recall and F score of the entities and the sentiments.
+    Scores with no entity to divide by are 0
+    """
+
+    results = dict(counts)
+    for target in ['entity', 'sentiment']:
+        correct = counts['correct_' + target]
+        precision = correct / counts['predicted'] if counts['predicted'] else 0
+        recall = correct / counts['observed'] if counts['observed'] else 0
+        results[target + '_precision'] = precision
+        results[target + '_recall'] = recall
+        results[target + '_f'] = f_score(precision, recall)
+    return results
+
+def evaluate(gold_file, prediction_file, separator=' ', column=1):
+    """
+    Returns the scores of prediction_file against gold_file,
+    reading both files side by side one sentence at a time
+    """
+
+    with open(gold_file, encoding='utf8') as gold, open(prediction_file, encoding='utf8') as prediction:
+        return scores(count_matches(iter_sentence_spans(gold, separator, column), iter_sentence_spans(prediction, separator, column)))
+
+def read_gold(gold_file, separator=' ', column=1):
+    """
+    Returns the list of the span dicts of every sentence of gold_file,
+    to score any number of prediction files against with score_prediction
+    """
+
+    with open(gold_file, encoding='utf8') as gold:
+        return list(iter_sentence_spans(gold, separator, column))
+
+def score_prediction(observed_sentences, prediction_file, separator=' ', column=1):
+    """
+    Returns the scores of prediction_file against the span dicts
+    of the gold data returned by read_gold
+    """
+
+    with open(prediction_file, encoding='utf8') as prediction:
+        return scores(count_matches(observed_sentences, iter_sentence_spans(prediction, separator, column)))
+
+def evaluate_all(predictions, processes=1, separator=' ', column=1):
+    """
+    Takes a dict from gold files to lists of prediction files and returns the
+    results table of every prediction file: a list of dicts with the RESULT_FIELDS,
+    in order. Every gold file is only read once, and with more than one
+    process the prediction files are scored in parallel
+    """
+
+    rows = []
+    observed_sentences = []
+    for gold_file, prediction_files in predictions.items():
+        observed = read_gold(gold_file, separator, column)
+        for prediction_file in prediction_files:
+            rows.append({ 'gold_file': gold_file, 'prediction_file': prediction_file })
+            observed_sentences.append(observed)
+    prediction_files = [row['prediction_file'] for row in rows]
+
+    if processes == 1:
+        all_scores = list(map(score_prediction, observed_sentences, prediction_files, repeat(separator), repeat(column)))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            all_scores = list(executor.map(score_prediction, observed_sentences, prediction_files, repeat(separator), repeat(column)))
+
+    for row, results in zip(rows, all_scores):
+        row.update(results)
+    return rows
+
+def write_results_json(results, results_file):
+    with open(results_file, 'w', encoding='utf8') as f:
+        json.dump(results, f, indent=2)
+
+def write_results_csv(results, results_file):
+    with open(results_file, 'w', encoding='utf8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+def read_gold_tag_ids(gold_file, tagset, separator=' ', column=1):
+    """
+    Reads the tags of gold_file as ids of tagset and returns a tuple of the
+    array of the tag ids of every word and the array of the number of words
+    of every sentence, with sentences ending at the same places as in iter_sentence_spans
+    """
+
+    tag_id = tagset.id
+    tag_ids = array('i')
+    lengths = array('i')
+    length = 0
+    with open(gold_file, encoding='utf8') as gold:
+        for line in gold:
+            line = line.strip()
+            if line.startswith("##"):
+                continue
+            elif len(line) == 0:
+                lengths.append(length)
+                length = 0
+                continue
+            tag_ids.append(tag_id(line.split(separator)[column]))
+            length += 1
+    lengths.append(length)
+
+    return np.array(tag_ids, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+def tag_sentiments(tagset):
+    """
+    Returns a tuple of the list of the sentiments of the tags of tagset in order
+    of first appearance, and the arrays of the B, I or O letter and of the
+    sentiment index (-1 for O) of every tag id
+    """
+
+    sentiments = []
+    for symbol in tagset.symbols:
+        if symbol[0] not in 'BIO':
+            raise ValueError("%s is not a B, I or O tag" % symbol)
+        if symbol != 'O' and symbol[2:] not in sentiments:
+            sentiments.append(symbol[2:])
+    tag_ne = np.array([symbol[0] for symbol in tagset.symbols])
+    tag_sentiment = np.array([sentiments.index(symbol[2:]) if symbol != 'O' else -1 for symbol in tagset.symbols])
+    return sentiments, tag_ne, tag_sentiment
+
+def tag_id_spans(tag_ids, lengths, tagset):
+    """
+    Takes an array of the tag ids of every word, the array of the number of
+    words of every sentence and the tagset of the ids, and returns a tuple of
+    the arrays of the sentence, begin, length and sentiment index (into the
+    sentiments of tag_sentiments) of every entity,
+    read the same way as iter_sentence_spans
+    """
+
+    sentiments, tag_ne, tag_sentiment = tag_sentiments(tagset)
+    ne = tag_ne[tag_ids]
+    sentiment = tag_sentiment[tag_ids]
+    sentence = np.repeat(np.arange(len(lengths)), lengths)
+    first = np.zeros(len(tag_ids), dtype=bool)
+    first[(np.cumsum(lengths) - lengths)[lengths > 0]] = True
+
+    # The tag before the first word of a sentence counts as O
+    previous_o = np.concatenate([[True], ne[:-1] == 'O']) | first
+    previous_sentiment = np.concatenate([[-1], sentiment[:-1]])
+    starts = (ne == 'B') | ((ne == 'I') & (previous_o | (previous_sentiment != sentiment)))
+
+    # Every word of an entity belongs to the entity of the last start
+    entity_words = ne != 'O'
+    entity_ids = np.cumsum(starts)[entity_words] - 1
+    begins = np.nonzero(starts)[0]
+    word_index = np.arange(len(tag_ids)) - (np.cumsum(lengths) - lengths)[sentence]
+
+    return sentence[begins], word_index[begins], np.bincount(entity_ids, minlength=len(begins)), sentiment[begins]
+
+def match_spans(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset):
+    """
+    Returns a tuple of the gold and predicted spans (as returned by tag_id_spans,
+    without the predicted sentences past the end of the gold data) and the arrays
+    of the indices of the gold and predicted spans with the same
+    (sentence, begin, length), found in one sorted intersection
+    """
+
+    observed = tag_id_spans(observed_tag_ids, observed_lengths, tagset)
+    predicted = tag_id_spans(predicted_tag_ids, predicted_lengths, tagset)
+    in_gold = predicted[0] < len(observed_lengths)
+    predicted = tuple(values[in_gold] for values in predicted)
+
+    size = max(observed_lengths.max(initial=0), predicted_lengths.max(initial=0)) + 1
+    keys = [(sentence * size + begin) * size + length for sentence, begin, length, sentiment in [observed, predicted]]
+    matches, observed_matches, predicted_matches = np.intersect1d(keys[0], keys[1], assume_unique=True, return_indices=True)
+    return observed, predicted, observed_matches, predicted_matches
+
+def evaluate_tag_ids(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset):
+    """
+    Returns the scores, as returned by scores, of the predicted tag ids of every
+    sentence against the gold ones (as returned by read_gold_tag_ids), with the
+    entities matched by match_spans.
+    Predicted sentences past the end of the gold data are ignored, as in count_matches
+    """
+
+    observed, predicted, observed_matches, predicted_matches = match_spans(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset)
+
+    return scores({
+        'observed': len(observed[0]),
+        'predicted': len(predicted[0]),
+        'correct_entity': len(observed_matches),
+        'correct_sentiment': int((observed[3][observed_matches] == predicted[3][predicted_matches]).sum()),
+    })
+
+def evaluate_paths(observed_tag_ids, observed_lengths, paths, tagset, sequences=None):
+    """
+    Same as evaluate_tag_ids with the list of the decoded paths of every
+    sentence, lists of tag ids without START and STOP, as the predictions.
+    If the decoded sequences of words are given, words starting with ## are
+    left out, as their lines are skipped when reading a file of predictions
+    """
+
+    predicted_tag_ids = np.fromiter(chain.from_iterable(paths), dtype=np.int64)
+    predicted_lengths = np.array([len(path) for path in paths], dtype=np.int64)
+
+    if sequences is not None:
+        kept = np.fromiter((not word.startswith("##") for word in chain.from_iterable(sequences)), dtype=bool, count=len(predicted_tag_ids))
+        predicted_tag_ids = predicted_tag_ids[kept]
+        predicted_lengths = np.bincount(np.repeat(np.arange(len(paths)), predicted_lengths)[kept], minlength=len(paths))
+
+    return evaluate_tag_ids(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset)
+
+def precision_recall_f(correct, predicted, observed):
+    """
+    Takes arrays of correct, predicted and gold counts and returns
+    a tuple of the arrays of the precisions, recalls and F scores,
+    which are 0 where there is nothing to divide by
+    """
+
+    precision = np.divide(correct, predicted, out=np.zeros(len(correct)), where=predicted > 0)
+    recall = np.divide(correct, observed, out=np.zeros(len(correct)), where=observed > 0)
+    f = np.divide(2 * precision * recall, precision + recall, out=np.zeros(len(correct)), where=precision + recall >= 1e-6)
+    return precision, recall, f
+
+def confusion_matrix(observed_tag_ids, predicted_tag_ids, n):
+    """
+    Returns the (n, n) array whose [i][j] element is the number of words
+    with the gold tag id i and the predicted tag id j
+    """
+
+    if len(observed_tag_ids) != len(predicted_tag_ids):
+        raise ValueError("The gold data has %d words and the predictions have %d" % (len(observed_tag_ids), len(predicted_tag_ids)))
+    return np.bincount(observed_tag_ids * n + predicted_tag_ids, minlength=n * n).reshape(n, n)
+
+def tag_report(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset):
+    """
+    Returns a dict, made only of lists, dicts and numbers so that it can be
+    saved as JSON, with the confusion matrix of the tags of every word,
+    the accuracy, the precision, recall, F score and gold count of every tag
+    and the span scores (as in evaluate_tag_ids) of every sentiment,
+    where a span is correct if its begin, length and sentiment are correct.
+    The predictions must have as many words as the gold data in every sentence
+    """
+
+    if not np.array_equal(observed_lengths, predicted_lengths):
+        raise ValueError("The sentences of the predictions do not have the same lengths as the gold ones")
+
+    n = len(tagset)
+    confusion = confusion_matrix(observed_tag_ids, predicted_tag_ids, n)
+    correct = np.diagonal(confusion)
+    observed_counts = confusion.sum(axis=1)
+    predicted_counts = confusion.sum(axis=0)
+    precision, recall, f = precision_recall_f(correct, predicted_counts, observed_counts)
+
+    sentiments = tag_sentiments(tagset)[0]
+    observed, predicted, observed_matches, predicted_matches = match_spans(observed_tag_ids, observed_lengths, predicted_tag_ids, predicted_lengths, tagset)
+    matched_sentiments = observed[3][observed_matches]
+    matched_sentiments = matched_sentiments[matched_sentiments == predicted[3][predicted_matches]]
+    span_correct = np.bincount(matched_sentiments, minlength=len(sentiments))
+    span_observed = np.bincount(observed[3], minlength=len(sentiments))
+    span_predicted = np.bincount(predicted[3], minlength=len(sentiments))
+    span_precision, span_recall, span_f = precision_recall_f(span_correct, span_predicted, span_observed)
+
+    return {
+        'symbols': list(tagset.symbols),
+        'confusion': confusion.tolist(),
+        'accuracy': float(correct.sum() / len(observed_tag_ids)) if len(observed_tag_ids) else 0,
+        'tags': { symbol: {
+            'observed': int(observed_counts[i]),
+            'predicted': int(predicted_counts[i]),
+            'correct': int(correct[i]),
+            'precision': float(precision[i]),
+            'recall': float(recall[i]),
+            'f': float(f[i]),
+        } for i, symbol in enumerate(tagset.symbols) },
+        'sentiments': { sentiment: {
+            'observed': int(span_observed[i]),
+            'predicted': int(span_predicted[i]),
+            'correct': int(span_correct[i]),
+            'precision': float(span_precision[i]),
+            'recall': float(span_recall[i]),
+            'f': float(span_f[i]),
+        } for i, sentiment in enumerate(sentiments) },
+    }
+
+def evaluate_tags(gold_file, prediction_file, tagset, separator=' ', column=1):
+    """
+    Returns the tag_report of prediction_file against gold_file
+    """
+
+    return tag_report(*read_gold_tag_ids(gold_file, tagset, separator, column), *read_gold_tag_ids(prediction_file, tagset, separator, column), tagset)
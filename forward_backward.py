@@ -0,0 +1,107 @@
+import numpy as np
+from part_3 import get_model, get_observation_sequences, log_emission_scores, length_buckets
+
+# The forward and backward recursions sum over every path in log space.
+# Each step shifts the scores by their maximum, exponentiates them and takes
+# one product with the transition probability matrix, so the only logs and
+# exps are of vectors and log(0) transitions stay tiny positive probabilities
+
+def forward_backward(emission_scores, transition_matrix):
+    """
+    Takes an array of log emission scores for a sequence
+    (as returned by log_emission_scores) and an array of log
+    transition scores (as returned by compile_transition_matrix)
+    and returns a tuple of the array of posterior probabilities,
+    where the value of a[k][i] is the probability that the kth
+    observation has symbols[i] given the whole sequence,
+    and the log likelihood of the sequence (summed over every path)
+    """
+
+    posteriors, log_likelihoods = batch_forward_backward(emission_scores[None], np.array([len(emission_scores)]), transition_matrix)
+    return posteriors[0], log_likelihoods[0]
+
+def batch_forward_backward(emission_scores, lengths, transition_matrix):
+    """
+    Batched version of forward_backward.
+    Takes a (batch, length, symbols) array of log emission scores for a batch
+    of sequences padded to the same length, an array of the true length of
+    every sequence and an array of log transition scores, and returns a tuple
+    of the (batch, length, symbols) array of posterior probabilities and the
+    array of log likelihoods. Posteriors past a sequence's length are padding
+    """
+
+    batch_size, n = emission_scores.shape[:2]
+    transitions = np.exp(transition_matrix[:-1, :-1])
+    stop_scores = transition_matrix[:-1, -1]
+
+    # Forward, the [b][k][v] element is the log score of all paths
+    # of the bth sequence that reach v at the kth observation
+    forward = np.zeros(emission_scores.shape)
+    forward[:, 0] = transition_matrix[-1, :-1] + emission_scores[:, 0]
+    for k in range(1, n):
+        shift = forward[:, k - 1].max(axis=1, keepdims=True)
+        forward[:, k] = np.log(np.exp(forward[:, k - 1] - shift) @ transitions) + shift + emission_scores[:, k]
+
+    # Backward, the [b][k][u] element is the log score of all the ways the
+    # bth sequence can go on to STOP from u at the kth observation
+    backward = np.zeros(emission_scores.shape)
+    for k in range(n - 1, -1, -1):
+        if k < n - 1:
+            next_scores = emission_scores[:, k + 1] + backward[:, k + 1]
+            shift = next_scores.max(axis=1, keepdims=True)
+            backward[:, k] = np.log(np.exp(next_scores - shift) @ transitions.T) + shift
+        backward[:, k] = np.where((k == lengths - 1)[:, None], stop_scores, backward[:, k])
+
+    # Both recursions meet at the last observation of every sequence
+    last = np.arange(batch_size), lengths - 1
+    final_scores = forward[last] + backward[last]
+    shift = final_scores.max(axis=1)
+    log_likelihoods = np.log(np.exp(final_scores - shift[:, None]).sum(axis=1)) + shift
+
+    posteriors = np.exp(forward + backward - log_likelihoods[:, None, None])
+    return posteriors, log_likelihoods
+
+def batch_posteriors(observation_sequences, emission_table, transition_matrix, batch_size=256):
+    """
+    Returns the (length, symbols) array of posterior probabilities
+    of every observation sequence, batch_size sequences at a time,
+    in the original order
+    """
+
+    word_ids, log_emissions = emission_table
+
+    all_posteriors = [None] * len(observation_sequences)
+    for bucket, padded_word_ids, lengths in length_buckets(observation_sequences, word_ids, batch_size):
+        posteriors = batch_forward_backward(log_emissions[padded_word_ids], lengths, transition_matrix)[0]
+        for b, i in enumerate(bucket):
+            all_posteriors[i] = posteriors[b, :lengths[b]]
+
+    return all_posteriors
+
+def posterior_path(posteriors):
+    """
+    Returns the list of the symbol indices with the highest posterior
+    probability at every observation (the max-marginal decode), which
+    maximizes the expected number of correct symbols rather than the
+    probability of the whole path
+    """
+
+    return posteriors.argmax(axis=1).tolist()
+
+def posteriors_file(training_data, dev_in, batch_size=256):
+    """
+    Returns, for every sequence of dev_in, the array of posterior
+    probabilities of the symbols of the first order model trained on training_data
+    """
+
+    model = get_model(training_data)
+    return batch_posteriors(get_observation_sequences(dev_in), model.emission_table(), model.transition_matrix(), batch_size)
+
+def posterior_decode_file(training_data, dev_in, batch_size=256):
+    """
+    Same as part_3.decode_file with the max-marginal decode of posterior_path
+    """
+
+    model = get_model(training_data)
+    all_posteriors = batch_posteriors(get_observation_sequences(dev_in), model.emission_table(), model.transition_matrix(), batch_size)
+    return [["START"] + model.tagset.decode(posterior_path(posteriors)) + ["STOP"] for posteriors in all_posteriors]
@@ -0,0 +1,539 @@
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from part_2 import symbols
+from vocabulary import TagSet, Vocabulary
+from shards import find_sentence_shards, open_shard
+
+MODEL_FILE_MAGIC = b'HMMMODEL'
+MODEL_FILE_VERSION = 2
+
+# Identifies how counts are turned into probabilities (emission counts over
+# symbol count + 1, unseen words 1/(symbol count + 1), unsmoothed transitions).
+# Change it whenever the estimation changes, so that cached models are not reused
+ESTIMATOR_VERSION = 'add-one-unseen-1'
+
+MODEL_CACHE_DIR = '.model_cache'
+
+def log(x):
+    if x == 0:
+        return math.log(sys.float_info.min)
+    else:
+        return math.log(x)
+
+def model_fingerprint(emission_table, *transition_arrays):
+    """
+    Returns a hex digest of everything a decoder reads from a model:
+    the word ids and log scores of an emission table (as returned by
+    part_3.compile_emission_table) and any log transition arrays.
+    Decoders that give the same fingerprint give the same results
+    """
+
+    word_ids, log_emissions = emission_table
+    digest = hashlib.sha256()
+    digest.update('\n'.join(word_ids).encode('utf8'))
+    digest.update(np.fromiter(word_ids.values(), dtype=np.int64, count=len(word_ids)).tobytes())
+    for scores in (log_emissions,) + transition_arrays:
+        digest.update(json.dumps([scores.dtype.str, list(scores.shape)]).encode('utf8'))
+        digest.update(np.ascontiguousarray(scores).tobytes())
+    return digest.hexdigest()
+
+def log_probabilities(counts):
+    """
+    Takes an array of transition counts whose last axis is the next symbol
+    and returns the array of log transition probabilities,
+    with the same zero handling as estimate_transition_params
+    """
+
+    totals = counts.sum(axis=-1, keepdims=True)
+    probabilities = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+    return np.array([log(p) for p in probabilities.ravel().tolist()]).reshape(counts.shape)
+
+class HMMModel:
+    """
+    Holds every count needed by parts 3, 4 and 5 in flat integer arrays
+    indexed by the ids of a TagSet and a Vocabulary:
+    emission_counts[tag][word],
+    transition_counts[tag or START][tag or STOP] and
+    second_order_counts[tag or START][tag or START][tag or STOP].
+    The transitions are counted the same way as get_symbol_symbol_counts
+    and get_symbol_symbol_symbol_counts, so a training file
+    only has to be read once to estimate any of the models
+    """
+
+    def __init__(self, tagset=None):
+        self.tagset = tagset if tagset is not None else TagSet(symbols)
+        self.vocabulary = Vocabulary()
+
+        n = len(self.tagset)
+        self.emission_counts = np.zeros((n, 0), dtype=np.int32)
+        self.transition_counts = np.zeros((n + 1, n + 1), dtype=np.int64)
+        self.second_order_counts = np.zeros((n + 1, n + 1, n + 1), dtype=np.int64)
+
+        # The last two tags of the data (or only START if there was none),
+        # the history of the transitions of any data added by update
+        self.last_tags = [self.tagset.START]
+
+        # Log score arrays estimated from the counts, cleared whenever the counts change
+        self.compiled = {}
+
+    def add_emission_counts(self, tag_ids, word_ids):
+        """
+        Adds the counts of arrays of tag ids and word ids
+        """
+
+        n, n_words = len(self.tagset), len(self.vocabulary)
+        if n_words > self.emission_counts.shape[1]:
+            self.emission_counts = np.pad(self.emission_counts, ((0, 0), (0, n_words - self.emission_counts.shape[1])))
+
+        self.compiled.clear()
+        observations = tag_ids.astype(np.int64) * n_words + word_ids
+        self.emission_counts += np.bincount(observations, minlength=n * n_words).reshape(n, n_words).astype(np.int32)
+
+    def add_transition_counts(self, tag_sequence, first):
+        """
+        Adds the transitions into the tags of an array tag_sequence from index first on,
+        the tags before it are history whose transitions were already counted
+        """
+
+        self.compiled.clear()
+        size = len(self.tagset) + 1
+        tag_sequence = tag_sequence.astype(np.int64)
+
+        pairs = tag_sequence[first-1:-1] * size + tag_sequence[first:]
+        self.transition_counts += np.bincount(pairs, minlength=size**2).reshape(size, size)
+
+        # As in get_symbol_symbol_symbol_counts, the first tag after START has no second order transition
+        second = max(first, 2)
+        triples = (tag_sequence[second-2:-2] * size + tag_sequence[second-1:-1]) * size + tag_sequence[second:]
+        self.second_order_counts += np.bincount(triples, minlength=size**3).reshape(size, size, size)
+
+    def add_stop_counts(self, last_tags):
+        """
+        Adds the transitions into STOP after the last two tags of the data
+        """
+
+        self.compiled.clear()
+        STOP = self.tagset.STOP
+        self.transition_counts[last_tags[-1], STOP] += 1
+        self.second_order_counts[last_tags[-2], last_tags[-1], STOP] += 1
+
+    def merge(self, other):
+        """
+        Adds the counts of another model with the same tag set,
+        adding its words to the vocabulary in the order of their ids
+        """
+
+        if other.tagset != self.tagset:
+            raise ValueError("Models with different tag sets cannot be merged")
+
+        word_ids = np.array([self.vocabulary.add(word) for word in other.vocabulary.words], dtype=np.int64)
+        n_words = len(self.vocabulary)
+        if n_words > self.emission_counts.shape[1]:
+            self.emission_counts = np.pad(self.emission_counts, ((0, 0), (0, n_words - self.emission_counts.shape[1])))
+
+        self.compiled.clear()
+        self.emission_counts[:, word_ids] += other.emission_counts
+        self.transition_counts += other.transition_counts
+        self.second_order_counts += other.second_order_counts
+
+    def copy(self):
+        """
+        Returns a model with copies of the vocabulary and counts of this one,
+        that can be changed without changing this one. The compiled arrays are
+        shared, they are replaced rather than changed when the counts change
+        """
+
+        model = HMMModel(self.tagset)
+        model.vocabulary = Vocabulary(self.vocabulary.words)
+        model.emission_counts = np.array(self.emission_counts)
+        model.transition_counts = np.array(self.transition_counts)
+        model.second_order_counts = np.array(self.second_order_counts)
+        model.last_tags = list(self.last_tags)
+        model.compiled = dict(self.compiled)
+        return model
+
+    def update(self, training_file, buffer_size=1 << 20):
+        """
+        Adds the counts of training_file as if it were appended to the data
+        the model was trained on, which is never read again, so the updated model ends
+        up with the same counts as if train_model had read both files in a row.
+        Only the compiled rows whose counts changed are estimated again: the
+        emission columns of the tags of training_file and the transition rows
+        of the contexts whose transitions changed.
+        Returns the updated model as a new model, this one is left unchanged,
+        so models returned by get_model can be updated
+        """
+
+        model = self.copy()
+
+        # The counting methods clear the compiled arrays of the new model,
+        # the ones of this model are updated instead
+        compiled = self.compiled
+        old_words = len(self.vocabulary)
+
+        # The data no longer stops after its last tags
+        if len(model.last_tags) > 1:
+            STOP = model.tagset.STOP
+            model.transition_counts[model.last_tags[-1], STOP] -= 1
+            model.second_order_counts[model.last_tags[-2], model.last_tags[-1], STOP] -= 1
+
+        new_counts = HMMModel(model.tagset)
+        with open(training_file, encoding="utf8") as f:
+            head, tail = count_lines(new_counts, iter(lambda: f.readlines(buffer_size), []), np.zeros(0, dtype=np.int64), 2)
+        model.merge(new_counts)
+        if head:
+            model.add_transition_counts(np.array(model.last_tags + head), len(model.last_tags))
+        model.last_tags = (model.last_tags + tail.tolist())[-2:]
+        if len(model.last_tags) > 1:
+            model.add_stop_counts(model.last_tags)
+
+        model.compiled = {}
+        if 'log_emissions' in compiled:
+            log_emissions = np.full((len(model.vocabulary) + 1, len(model.tagset)), log(0))
+            log_emissions[:old_words] = compiled['log_emissions'][:-1]
+            log_emissions[-1] = compiled['log_emissions'][-1]
+
+            # Every emission probability of a tag depends on its total count
+            for tag in np.nonzero(new_counts.symbol_counts())[0].tolist():
+                counts = model.emission_counts[tag]
+                tag_count = int(counts.sum())
+                words = np.nonzero(counts)[0]
+                log_emissions[:-1, tag] = log(0)
+                log_emissions[words, tag] = [log(p) for p in (counts[words] / (tag_count + 1)).tolist()]
+                log_emissions[-1, tag] = log(1/(1 + tag_count))
+            model.compiled['log_emissions'] = log_emissions
+
+        for name, counts, old_counts in [('transition_matrix', model.transition_counts, self.transition_counts), ('second_order_transition_tensor', model.second_order_counts, self.second_order_counts)]:
+            if name in compiled:
+                scores = np.array(compiled[name])
+                changed = (counts != old_counts).any(axis=-1)
+                scores[changed] = log_probabilities(counts[changed])
+                model.compiled[name] = scores
+
+        return model
+
+    def symbol_counts(self):
+        """
+        Returns an array of the total count of every tag
+        """
+
+        return self.emission_counts.sum(axis=1)
+
+    def emission_table(self):
+        """
+        Returns the log emission table of the model
+        in the same layout as part_3.compile_emission_table
+        """
+
+        if 'log_emissions' not in self.compiled:
+            tag_counts = self.symbol_counts()
+            log_emissions = np.full((len(self.vocabulary) + 1, len(self.tagset)), log(0))
+
+            tags, words = np.nonzero(self.emission_counts)
+            probabilities = self.emission_counts[tags, words] / (tag_counts[tags] + 1)
+            log_emissions[words, tags] = [log(p) for p in probabilities.tolist()]
+            log_emissions[-1] = [log(1/(1 + count)) for count in tag_counts.tolist()]
+            self.compiled['log_emissions'] = log_emissions
+
+        return self.vocabulary.ids, self.compiled['log_emissions']
+
+    def transition_matrix(self):
+        """
+        Returns the log transition matrix of the model
+        in the same layout as part_3.compile_transition_matrix
+        """
+
+        if 'transition_matrix' not in self.compiled:
+            self.compiled['transition_matrix'] = log_probabilities(self.transition_counts)
+        return self.compiled['transition_matrix']
+
+    def second_order_transition_tensor(self):
+        """
+        Returns the second order log transition tensor of the model
+        in the same layout as part_5.compile_second_order_transition_tensor
+        """
+
+        if 'second_order_transition_tensor' not in self.compiled:
+            self.compiled['second_order_transition_tensor'] = log_probabilities(self.second_order_counts)
+        return self.compiled['second_order_transition_tensor']
+
+    def fingerprint(self):
+        """
+        Returns the model_fingerprint of the log score arrays of the model,
+        which identifies its decoded sequences in a DecodeCache
+        """
+
+        if 'fingerprint' not in self.compiled:
+            self.compiled['fingerprint'] = model_fingerprint(self.emission_table(), self.transition_matrix(), self.second_order_transition_tensor())
+        return self.compiled['fingerprint']
+
+def count_lines(model, chunks, tag_sequence, first):
+    """
+    Adds the counts of an iterable of lists of lines of a training file to model.
+    tag_sequence is the array of tags before the lines, and transitions are only
+    counted into the tags from index first on of tag_sequence followed by the
+    tags of the lines. Returns a tuple of the list of the first two tags
+    of the lines and the array of the last two tags of the whole sequence
+    """
+
+    tag_id = model.tagset.id
+    add_word = model.vocabulary.add
+
+    # Tweets repeat a lot of identical lines, so each distinct line
+    # is only split and interned once, to an id into line_tags and line_words
+    line_ids = {}
+    line_tags = array('i')
+    line_words = array('i')
+
+    head = []
+
+    for lines in chunks:
+        observations = array('i')
+        for line in lines:
+            line_id = line_ids.get(line)
+            if line_id is None:
+                if line.isspace():
+                    continue
+                fields = line.split(' ')
+                line_id = line_ids[line] = len(line_tags)
+                line_tags.append(tag_id(fields[-1].strip()))
+                line_words.append(add_word(fields[0].strip()))
+            observations.append(line_id)
+
+        observations = np.frombuffer(observations, dtype=np.int32)
+        tag_ids = np.array(line_tags, dtype=np.int32)[observations]
+        model.add_emission_counts(tag_ids, np.array(line_words, dtype=np.int32)[observations])
+        head += tag_ids[:2 - len(head)].tolist()
+
+        history = len(tag_sequence)
+        tag_sequence = np.concatenate([tag_sequence, tag_ids])
+        model.add_transition_counts(tag_sequence, max(history, first))
+
+        # Only the last two tags are needed as history, shift first with them
+        first = max(first - max(len(tag_sequence) - 2, 0), 0)
+        tag_sequence = tag_sequence[-2:]
+
+    return head, tag_sequence
+
+def train_shard(training_file, start, end, symbols, buffer_size=1 << 20):
+    """
+    Counts the bytes start to end of training_file, a shard made of whole
+    sentences, except for the transitions into its first two tags, which
+    depend on the tags before the shard. Returns a tuple of the model of the
+    counts, the list of the first two tags and the list of the last two tags
+    """
+
+    model = HMMModel(TagSet(symbols))
+    with open_shard(training_file, start, end) as f:
+        head, tail = count_lines(model, iter(lambda: f.readlines(buffer_size), []), np.zeros(0, dtype=np.int64), 2)
+    return model, head, tail.tolist()
+
+def train_model(training_file, tagset=None, buffer_size=1 << 20, processes=1, shard_size=1 << 24):
+    """
+    Takes a training data file formatted with lines like
+    (word) (symbol)
+    and returns an HMMModel with the emission, first order
+    and second order transition counts, all built in a single
+    pass over the file.
+    The file is read about buffer_size characters at a time,
+    and the counts of each buffer are added to the count arrays at once.
+    With more than one process, the file is split into sentence aligned shards
+    of about shard_size bytes that are counted in parallel with train_shard
+    and merged in order, giving exactly the same counts
+    """
+
+    model = HMMModel(tagset)
+
+    if processes == 1:
+        with open(training_file, encoding="utf8") as f:
+            tail = count_lines(model, iter(lambda: f.readlines(buffer_size), []), np.array([model.tagset.START]), 1)[1].tolist()
+    else:
+        tail = [model.tagset.START]
+        shards = find_sentence_shards(training_file, shard_size)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            partial_counts = executor.map(train_shard, repeat(training_file), [start for start, end in shards], [end for start, end in shards], repeat(model.tagset.symbols), repeat(buffer_size))
+            for shard_model, head, shard_tail in partial_counts:
+                model.merge(shard_model)
+                # Transitions carry on across sentences, so the first two tags
+                # of a shard follow the last two tags before it
+                if head:
+                    model.add_transition_counts(np.array(tail + head), len(tail))
+                tail = (tail + shard_tail)[-2:]
+
+    if len(tail) > 1:
+        model.add_stop_counts(tail)
+    model.last_tags = tail
+
+    return model
+
+def save_model(model, model_file):
+    """
+    Writes the tag set, vocabulary, last tags, counts and log score arrays of a model
+    to a binary file made of a fixed size preamble (magic, format version and
+    header length), a JSON header describing every buffer, and the raw buffers,
+    each aligned to 64 bytes so that load_model can memory-map them
+    """
+
+    arrays = {
+        'emission_counts': model.emission_counts,
+        'transition_counts': model.transition_counts,
+        'second_order_counts': model.second_order_counts,
+        'log_emissions': model.emission_table()[1],
+        'transition_matrix': model.transition_matrix(),
+        'second_order_transition_tensor': model.second_order_transition_tensor(),
+    }
+    buffers = [('words', '\n'.join(model.vocabulary.words).encode('utf8'))]
+    buffers += [(name, np.ascontiguousarray(value).tobytes()) for name, value in arrays.items()]
+
+    # Lay out the buffers after a header whose size is only known once it is written,
+    # so offsets are relative to the end of the header
+    layout = {}
+    offset = 0
+    for name, buffer in buffers:
+        offset = -(-offset // 64) * 64
+        layout[name] = { 'offset': offset, 'length': len(buffer) }
+        offset += len(buffer)
+    for name, value in arrays.items():
+        layout[name]['dtype'] = value.dtype.str
+        layout[name]['shape'] = list(value.shape)
+
+    layout['words']['count'] = len(model.vocabulary)
+
+    header = json.dumps({ 'symbols': model.tagset.symbols, 'last_tags': model.last_tags, 'buffers': layout }).encode('utf8')
+    data_start = -(-(len(MODEL_FILE_MAGIC) + 12 + len(header)) // 64) * 64
+
+    with open(model_file, 'wb') as f:
+        f.write(MODEL_FILE_MAGIC)
+        f.write(MODEL_FILE_VERSION.to_bytes(4, 'little'))
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, buffer in buffers:
+            f.seek(data_start + layout[name]['offset'])
+            f.write(buffer)
+
+def load_model(model_file):
+    """
+    Reads a model written by save_model.
+    The arrays are memory-mapped rather than read, so loading is fast and
+    processes loading the same file share its pages. Log score arrays are
+    read-only and count arrays are copy-on-write, so the file is never modified
+    """
+
+    with open(model_file, 'rb') as f:
+        magic = f.read(len(MODEL_FILE_MAGIC))
+        if magic != MODEL_FILE_MAGIC:
+            raise ValueError("%s is not a model file" % model_file)
+        version = int.from_bytes(f.read(4), 'little')
+        if version != MODEL_FILE_VERSION:
+            raise ValueError("%s has model file version %d, expected %d" % (model_file, version, MODEL_FILE_VERSION))
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length).decode('utf8'))
+        data_start = -(-(len(MODEL_FILE_MAGIC) + 12 + header_length) // 64) * 64
+
+        layout = header['buffers']
+        f.seek(data_start + layout['words']['offset'])
+        words = f.read(layout['words']['length']).decode('utf8')
+
+    def array_of(name, mode):
+        buffer = layout[name]
+        if buffer['length'] == 0:
+            return np.zeros(buffer['shape'], dtype=np.dtype(buffer['dtype']))
+        return np.memmap(model_file, dtype=np.dtype(buffer['dtype']), mode=mode, offset=data_start + buffer['offset'], shape=tuple(buffer['shape']))
+
+    model = HMMModel(TagSet(header['symbols']))
+    model.vocabulary = Vocabulary(words.split('\n') if layout['words']['count'] else [])
+    model.last_tags = header['last_tags']
+    model.emission_counts = array_of('emission_counts', 'c')
+    model.transition_counts = array_of('transition_counts', 'c')
+    model.second_order_counts = array_of('second_order_counts', 'c')
+    for name in ['log_emissions', 'transition_matrix', 'second_order_transition_tensor']:
+        model.compiled[name] = array_of(name, 'r')
+
+    return model
+
+# In-process caches of trained models by cache key,
+# and of training file hashes by (path, modification time, size)
+_models = {}
+_file_hashes = {}
+
+def training_file_hash(training_file):
+    """
+    Returns the SHA-256 hex digest of the content of a training file,
+    only re-reading the file if it was modified since it was last hashed
+    """
+
+    stat = os.stat(training_file)
+    key = (os.path.abspath(training_file), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(training_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def model_cache_key(training_file, tagset=None):
+    """
+    Returns the key under which a model trained on training_file is cached:
+    a hash of the file content together with every setting that changes the
+    estimated parameters
+    """
+
+    settings = {
+        'training_file': training_file_hash(training_file),
+        'symbols': (tagset if tagset is not None else TagSet(symbols)).symbols,
+        'estimator': ESTIMATOR_VERSION,
+        'format': MODEL_FILE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf8')).hexdigest()
+
+def get_model(training_file, tagset=None, cache_dir=MODEL_CACHE_DIR):
+    """
+    Returns the model trained on training_file, like train_model, but only
+    trains it if no model with the same cache key was trained before:
+    models are kept in memory for the rest of the process, and saved to
+    cache_dir so that later runs can load them instead.
+    Every call returns the same model, so change a copy of it
+    (HMMModel.update returns one).
+    Pass cache_dir=None to only cache in memory
+    """
+
+    key = model_cache_key(training_file, tagset)
+    if key in _models:
+        return _models[key]
+
+    model_file = os.path.join(cache_dir, key + '.hmm') if cache_dir is not None else None
+    if model_file is not None and os.path.exists(model_file):
+        model = load_model(model_file)
+    else:
+        model = train_model(training_file, tagset)
+        if model_file is not None:
+            # Write to a temporary file first so that concurrent runs never see a partial model
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, temporary_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            os.close(fd)
+            try:
+                save_model(model, temporary_file)
+                os.replace(temporary_file, model_file)
+            except BaseException:
+                os.remove(temporary_file)
+                raise
+
+    _models[key] = model
+    return model
+
+def clear_model_cache():
+    """
+    Forgets the models cached in memory, models saved on disk are kept
+    """
+
+    _models.clear()
+    _file_hashes.clear()
@@ -1,4 +1,5 @@
 from collections import defaultdict
+from writer import write_word_symbol_pairs
 
 symbols = ['O', 'B-positive', 'I-positive', 'B-neutral', 'I-neutral', 'B-negative', 'I-negative']
 
@@ -98,7 +99,4 @@ def find_symbol_estimate(dev_file, emission_probabilities, symbol_counts):
     return predicted_word_symbol_sequence
 
 def write_part_2_dev_out(filename, predicted_word_symbol_sequence):
-    result_file = open(filename, "w", encoding="utf8")
-
-    for word_and_symbol in predicted_word_symbol_sequence:
-        result_file.write(' '.join(word_and_symbol) + "\n")
+    write_word_symbol_pairs(predicted_word_symbol_sequence, filename)
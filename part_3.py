@@ -1,7 +1,12 @@
 import math
 import sys
+import numpy as np
 from part_2 import symbols, get_symbol_word_counts, estimate_emission_params, emission_probability
+from model import train_model, get_model, model_fingerprint
 from collections import defaultdict
+from writer import write_sequences, write_predicted_symbols
+from evaluation import read_gold_tag_ids, evaluate_paths
+from itertools import islice
 
 def log(x):
     if x == 0:
@@ -9,6 +14,14 @@ def log(x):
     else:
         return math.log(x)
 
+def symbol_index_type(n_symbols):
+    """
+    Returns the smallest integer dtype that holds every
+    symbol index, for back pointer and path arrays
+    """
+
+    return np.min_scalar_type(max(n_symbols - 1, 0))
+
 def get_symbol_symbol_counts(training_data):
     """
     Takes a training data file formatted with lines like
@@ -70,89 +83,304 @@ def get_transition_probabilities(training_data):
     symbol_symbol_counts, symbol_counts = get_symbol_symbol_counts(training_data)
     return estimate_transition_params(symbol_symbol_counts, symbol_counts)
 
-def get_observation_sequences(dev_file):
-    sequences = []
+def compile_emission_table(emission_probabilities, symbol_counts):
+    """
+    Takes a nested dictionary of emission probabilities
+    and a dictionary of symbol counts
+    and returns a tuple of a dictionary mapping every seen word to an
+    integer id and an array of log emission scores
+    where the value of a[id][i] is the log emission score of symbols[i]
+    for the word with that id.
+    The last row is shared by all words unseen in the training data,
+    so each word only has to be looked up once per token
+    """
+
+    word_ids = {}
+    for symbol in emission_probabilities:
+        for word in emission_probabilities[symbol]:
+            if word not in word_ids:
+                word_ids[word] = len(word_ids)
+
+    log_emissions = np.full((len(word_ids) + 1, len(symbols)), log(0))
+    for i, symbol in enumerate(symbols):
+        for word, probability in emission_probabilities[symbol].items():
+            log_emissions[word_ids[word], i] = log(probability)
+
+    log_emissions[-1] = [log(1/(1 + symbol_counts[symbol])) for symbol in symbols]
+
+    return word_ids, log_emissions
+
+def log_emission_scores(sequence, emission_table):
+    """
+    Returns an array of the log emission scores of a sequence of words
+    where the value of a[k][i] is the log emission score of symbols[i]
+    for the kth word, from a table built by compile_emission_table
+    """
+
+    word_ids, log_emissions = emission_table
+    return log_emissions[[word_ids.get(word, -1) for word in sequence]]
+
+def compile_transition_matrix(transition_probabilities):
+    """
+    Takes a nested dictionary of transition probabilities
+    and returns an array of log transition scores
+    where the value of a[i][j] is the log score of transitioning
+    from symbols[i] to symbols[j].
+    The last row holds the transitions from START
+    and the last column the transitions to STOP
+    """
+
+    from_symbols = symbols + ['START']
+    to_symbols = symbols + ['STOP']
+    return np.array([[log(transition_probabilities[symbol1].get(symbol2, 0)) for symbol2 in to_symbols] for symbol1 in from_symbols])
+
+def iter_observation_sequences(dev_file):
+    """
+    Yields the sequences of words of dev_file one at a time,
+    so only one sequence is held in memory
+    """
+
     with open(dev_file, encoding="utf8") as f:
         sequence = []
         for line in f:
             if line.isspace():
                 if sequence!=[]:
-                    sequences.append(sequence)
+                    yield sequence
                 sequence = []
             else:
                 word = line.strip()
                 sequence.append(word)
         if sequence!=[]:
-            sequences.append(sequence)
-    return sequences
-
-def viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences):
-    all_predicted_symbols = []
-    for sequence in observation_sequences:
-
-        # Initialize probability score and optimal symbol matrices
-        n = len(sequence)
-        scores_and_previous_symbols = {}
-        scores_and_previous_symbols[n+1] = {}
-        for k in range(n + 1):
-            scores_and_previous_symbols[k] = {}
-            for symbol in symbols:
-                scores_and_previous_symbols[k][symbol] = []
-
-        # Set base case
-        for symbol in symbols:
-            scores_and_previous_symbols[0][symbol]= (0, "NA")
-            scores_and_previous_symbols[1][symbol] = (log(transition_probabilities["START"][symbol]) + log(emission_probability(symbol, sequence[0], emission_probabilities, symbol_counts)), "START")
-        scores_and_previous_symbols[0]["STOP"]= (0, "NA")
-        scores_and_previous_symbols[0]["START"]= (1, "NA")
-
-        # Move forward recursively
-        for k in range(2, n + 1):
-            for v in symbols:
-                # Get the max probability score
-                kth_word = sequence[k-1]
-                probabilities_and_previous_symbols = [(scores_and_previous_symbols[k-1][u][0] + log(transition_probabilities[u][v]) + log(emission_probability(v, kth_word, emission_probabilities, symbol_counts)), u) for u in symbols]
-                scores_and_previous_symbols[k][v] = max(probabilities_and_previous_symbols, key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0])
-
-        probabilities_and_previous_symbols = [(scores_and_previous_symbols[n][u][0] + log(transition_probabilities[u]["STOP"]), u) for u in symbols]
-        scores_and_previous_symbols[n+1]["STOP"] = max(probabilities_and_previous_symbols, key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0])
-
-        # Predict symbol sequence
-        predicted_symbols = ["STOP"]
-        for k in range(n + 1, 0, -1):
-            predicted_symbols.insert(0, scores_and_previous_symbols[k][predicted_symbols[0]][1])
-
-        all_predicted_symbols.append(predicted_symbols)
-
-    return all_predicted_symbols
-
-def decode_file(training_data, dev_in):
-    symbol_word_counts, symbol_counts = get_symbol_word_counts(training_data)
-    emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
+            yield sequence
 
-    symbol_symbol_counts, symbol_counts = get_symbol_symbol_counts(training_data)
-    transition_probabilities = estimate_transition_params(symbol_symbol_counts, symbol_counts)
+def get_observation_sequences(dev_file):
+    return list(iter_observation_sequences(dev_file))
+
+def best_path(emission_scores, transition_matrix):
+    """
+    Takes an array of log emission scores for a sequence
+    (as returned by log_emission_scores) and an array of log
+    transition scores (as returned by compile_transition_matrix)
+    and returns the list of symbol indices of the highest scoring path
+    """
+
+    n = len(emission_scores)
+    transition_scores = transition_matrix[:-1, :-1]
+
+    # Set base case
+    scores = transition_matrix[-1, :-1] + emission_scores[0]
+    previous_symbols = np.zeros((n, len(transition_scores)), dtype=symbol_index_type(len(transition_scores)))
+
+    # Move forward recursively, the [u][v] element of each step
+    # is the score of reaching v at the kth observation from u.
+    # Zero probability transitions are scored as log(0), a finite penalty that
+    # can still be on the best path, so every transition is kept: restricting
+    # each v to its seen predecessors would change results, and checking when
+    # it is safe costs more than this whole array step
+    for k in range(1, n):
+        step_scores = scores[:, None] + transition_scores + emission_scores[k]
+        previous_symbols[k] = step_scores.argmax(axis=0)
+        scores = step_scores.max(axis=0)
+
+    # Final entry, then follow the back pointers
+    path = [int((scores + transition_matrix[:-1, -1]).argmax())]
+    previous_symbols = previous_symbols.tolist()
+    for k in range(n - 1, 0, -1):
+        path.append(previous_symbols[k][path[-1]])
+    path.reverse()
+
+    return path
+
+def best_paths(emission_scores, lengths, transition_matrix):
+    """
+    Batched version of best_path.
+    Takes a (batch, length, symbols) array of log emission scores
+    for a batch of sequences padded to the same length, an array of
+    the true length of every sequence and an array of log transition scores,
+    and returns a (batch, length) array of the symbol indices of the highest
+    scoring path of every sequence. Entries past a sequence's length are padding
+    """
+
+    batch_size, n = emission_scores.shape[:2]
+    transition_scores = transition_matrix[:-1, :-1]
+    batch = np.arange(batch_size)
+
+    # Set base case
+    scores = transition_matrix[-1, :-1] + emission_scores[:, 0]
+    previous_symbols = np.zeros((batch_size, n, len(transition_scores)), dtype=symbol_index_type(len(transition_scores)))
+
+    # Move forward recursively, sequences that already ended keep their scores
+    for k in range(1, n):
+        step_scores = scores[:, :, None] + transition_scores + emission_scores[:, k, None, :]
+        previous_symbols[:, k] = step_scores.argmax(axis=1)
+        scores = np.where((k < lengths)[:, None], step_scores.max(axis=1), scores)
+
+    # Final entry, then follow the back pointers of every sequence from its last observation
+    last_symbols = (scores + transition_matrix[:-1, -1]).argmax(axis=1)
+    paths = np.zeros((batch_size, n), dtype=symbol_index_type(len(transition_scores)))
+    current_symbols = last_symbols
+    for k in range(n - 1, -1, -1):
+        current_symbols = np.where(k == lengths - 1, last_symbols, current_symbols)
+        paths[:, k] = current_symbols
+        current_symbols = previous_symbols[batch, k, current_symbols]
+
+    return paths
+
+def length_buckets(observation_sequences, word_ids, batch_size):
+    """
+    Yields (bucket, padded word ids, lengths) tuples for batches of
+    batch_size observation sequences of similar lengths, where bucket is the
+    list of indices of the sequences in observation_sequences and padded
+    word ids is a (batch, length) array of their word ids padded with -1,
+    the id of unseen words
+    """
+
+    order = sorted(range(len(observation_sequences)), key=lambda i: len(observation_sequences[i]))
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        lengths = np.array([len(observation_sequences[i]) for i in bucket])
+
+        padded_word_ids = np.full((len(bucket), lengths.max()), -1)
+        for b, i in enumerate(bucket):
+            padded_word_ids[b, :lengths[b]] = [word_ids.get(word, -1) for word in observation_sequences[i]]
+
+        yield bucket, padded_word_ids, lengths
+
+def batch_best_paths(observation_sequences, emission_table, transition_matrix, batch_size=256):
+    """
+    Returns the list of symbol indices of the highest scoring path
+    of every observation sequence, decoding batch_size sequences at a time.
+    Sequences are bucketed by length so that little padding is needed,
+    and the paths are returned in the original order
+    """
+
+    word_ids, log_emissions = emission_table
+
+    all_paths = [None] * len(observation_sequences)
+    for bucket, padded_word_ids, lengths in length_buckets(observation_sequences, word_ids, batch_size):
+        # Padding is masked out by best_paths
+        paths = best_paths(log_emissions[padded_word_ids], lengths, transition_matrix).tolist()
+        for b, i in enumerate(bucket):
+            all_paths[i] = paths[b][:lengths[b]]
+
+    return all_paths
+
+def decode_sequences(observation_sequences, emission_table, transition_matrix, batch_size=256, cache=None, namespace=None):
+    """
+    Returns the symbol indices of the highest scoring path of every
+    observation sequence, decoding batch_size sequences at a time,
+    or one at a time if batch_size is None.
+    With a DecodeCache, sequences already decoded in namespace
+    are looked up instead, and their paths are returned as tuples
+    """
+
+    def batch_decode(sequences):
+        if batch_size is None:
+            return [best_path(log_emission_scores(sequence, emission_table), transition_matrix) for sequence in sequences]
+        return batch_best_paths(sequences, emission_table, transition_matrix, batch_size)
+
+    if cache is None:
+        return batch_decode(observation_sequences)
+    return cache.decode_all(namespace, observation_sequences, lambda sequences: [tuple(path) for path in batch_decode(sequences)])
+
+def batch_viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences, batch_size=256):
+    """
+    Same as viterbi, but decodes batch_size sequences at a time
+    """
+
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_matrix = compile_transition_matrix(transition_probabilities)
+
+    all_paths = batch_best_paths(observation_sequences, emission_table, transition_matrix, batch_size)
+    return [["START"] + [symbols[i] for i in path] + ["STOP"] for path in all_paths]
+
+def viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences, cache=None):
+    """
+    Returns the highest scoring symbol sequence of every observation sequence,
+    from START to STOP. Sequences found in a DecodeCache are not decoded again
+    """
+
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_matrix = compile_transition_matrix(transition_probabilities)
+
+    namespace = ('viterbi', model_fingerprint(emission_table, transition_matrix)) if cache is not None else None
+    all_paths = decode_sequences(observation_sequences, emission_table, transition_matrix, None, cache, namespace)
+
+    return [["START"] + [symbols[i] for i in path] + ["STOP"] for path in all_paths]
+
+def decode_file(training_data, dev_in, batch_size=256, cache=None):
+    """
+    Decodes dev_in with a first order model trained on training_data.
+    Sequences are decoded batch_size at a time,
+    or one at a time if batch_size is None,
+    and looked up in cache first if a DecodeCache is given
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_matrix = model.transition_matrix()
 
     observation_sequences = get_observation_sequences(dev_in)
-    predicted_symbols = viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)
+    namespace = ('viterbi', model.fingerprint()) if cache is not None else None
+    all_paths = decode_sequences(observation_sequences, emission_table, transition_matrix, batch_size, cache, namespace)
+    predicted_symbols = [["START"] + model.tagset.decode(path) + ["STOP"] for path in all_paths]
 
     # print(predicted_symbols)
     return predicted_symbols
 
+def decode_and_evaluate(training_data, dev_in, gold_file, prediction_file=None, batch_size=256, cache=None):
+    """
+    Decodes dev_in like decode_file and returns the scores of the paths against
+    gold_file (see evaluation.scores), computed from the tag ids of the paths
+    without writing or parsing any predicted symbols. The predictions are
+    only written if a prediction_file is given
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_matrix = model.transition_matrix()
+
+    observation_sequences = get_observation_sequences(dev_in)
+    namespace = ('viterbi', model.fingerprint()) if cache is not None else None
+    all_paths = decode_sequences(observation_sequences, emission_table, transition_matrix, batch_size, cache, namespace)
+    if prediction_file is not None:
+        write_predicted_symbols((model.tagset.decode(path) for path in all_paths), dev_in, prediction_file)
+
+    observed_tag_ids, observed_lengths = read_gold_tag_ids(gold_file, model.tagset)
+    return evaluate_paths(observed_tag_ids, observed_lengths, all_paths, model.tagset, observation_sequences)
+
+def iter_decode_file(training_data, dev_in, batch_size=256, cache=None):
+    """
+    Generator version of decode_file.
+    Reads, decodes and yields batch_size sequences of dev_in at a time
+    as (words, predicted symbols) tuples, where the predicted symbols
+    do not include START and STOP, so memory is bounded by the size of a batch
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_matrix = model.transition_matrix()
+    namespace = ('viterbi', model.fingerprint()) if cache is not None else None
+
+    observation_sequences = iter_observation_sequences(dev_in)
+    while True:
+        batch = list(islice(observation_sequences, batch_size or 1))
+        if batch == []:
+            return
+        all_paths = decode_sequences(batch, emission_table, transition_matrix, batch_size, cache, namespace)
+        for sequence, path in zip(batch, all_paths):
+            yield sequence, model.tagset.decode(path)
+
+def stream_decode_file(training_data, dev_in, prediction_file, batch_size=256, cache=None):
+    """
+    Decodes dev_in and writes each sequence to prediction_file as soon
+    as it is decoded, in the same format as add_predicted_symbols_to_file.
+    Sequences in dev_in are expected to be separated by single blank lines
+    """
+
+    write_sequences(iter_decode_file(training_data, dev_in, batch_size, cache), prediction_file)
+
 def add_predicted_symbols_to_file(predicted_symbols, dev_in, prediction_file):
-    result_file = open(prediction_file, "w", encoding="utf8")
-    symbols_list = []
-    for sequence_symbol in predicted_symbols:
-        for symbol in sequence_symbol:
-            if symbol!="START":
-                if symbol=="STOP":
-                    symbols_list.append("")
-                else:
-                    symbols_list.append(symbol)
-
-    with open(dev_in, encoding="utf8") as f:
-        for i,line in enumerate(f):
-            word_label = line.strip() + " " + symbols_list[i] + "\n"
-            result_file.write(word_label)
+    write_predicted_symbols((sequence_symbol[1:-1] for sequence_symbol in predicted_symbols), dev_in, prediction_file)
 
 
@@ -1,6 +1,8 @@
 import math
 import sys
-from part_3 import symbols, get_symbol_word_counts, get_symbol_symbol_counts, estimate_emission_params, emission_probability, estimate_transition_params, get_observation_sequences
+import numpy as np
+from writer import write_predicted_symbols
+from part_3 import symbols, get_symbol_word_counts, get_symbol_symbol_counts, estimate_emission_params, emission_probability, estimate_transition_params, get_observation_sequences, compile_emission_table, log_emission_scores, compile_transition_matrix, train_model, get_model, model_fingerprint, symbol_index_type
 
 def log(x):
     if x == 0:
@@ -8,99 +10,105 @@ def log(x):
     else:
         return math.log(x)
 
-def top_m_viterbi(m, transition_probabilities, emission_probabilities, symbol_counts, observation_sequences):
+def top_m_paths(m, emission_scores, transition_matrix):
+    """
+    Takes an array of log emission scores for a sequence and an array
+    of log transition scores (see part_3.best_path) and returns a list
+    of up to m (score, path) tuples of the m highest scoring paths, best first,
+    where path is a list of symbol indices.
+    Each lattice cell only keeps the scores of its m best partial paths
+    with a back pointer to the previous symbol and the rank of the path
+    through it, so whole paths are only built for the m that are returned
+    """
+
+    n = len(emission_scores)
+    n_symbols = len(transition_matrix) - 1
+    transition_scores = transition_matrix[:-1, :-1, None]
+
+    # Set base case, the [u][r] element of a cell is the score of the
+    # rth best path ending in u, or -inf if there are fewer than r + 1
+    scores = np.full((n_symbols, m), -np.inf)
+    scores[:, 0] = transition_matrix[-1, :-1] + emission_scores[0]
+    previous_symbols = np.zeros((n, n_symbols, m), dtype=symbol_index_type(n_symbols))
+    previous_ranks = np.zeros((n, n_symbols, m), dtype=np.int32)
+
+    # Unseen transitions are scored rather than skipped, see part_3.best_path.
+    # Move forward recursively, keeping the m best of the
+    # (previous symbol, rank) candidates of every symbol.
+    # Ties are broken by previous symbol and then by rank
+    for k in range(1, n):
+        step_scores = scores[:, None, :] + transition_scores
+        step_scores = (step_scores + emission_scores[k][:, None]).swapaxes(0, 1).reshape(n_symbols, -1)
+        best = np.argsort(-step_scores, axis=1, kind='stable')[:, :m]
+        scores = np.take_along_axis(step_scores, best, axis=1)
+        previous_symbols[k], previous_ranks[k] = np.divmod(best, m)
+
+    # Final entry
+    final_scores = (scores + transition_matrix[:-1, -1, None]).ravel()
+    best = np.argsort(-final_scores, kind='stable')[:m]
+    best = best[final_scores[best] > -np.inf]
+
+    # Follow the back pointers of all the returned paths at once
+    paths = np.zeros((n, len(best)), dtype=symbol_index_type(n_symbols))
+    current_symbols, current_ranks = np.divmod(best, m)
+    for k in range(n - 1, -1, -1):
+        paths[k] = current_symbols
+        current_symbols, current_ranks = previous_symbols[k, current_symbols, current_ranks], previous_ranks[k, current_symbols, current_ranks]
+
+    return list(zip(final_scores[best].tolist(), paths.T.tolist()))
+
+def top_m_decoder(m, emission_table, transition_matrix, cache=None, fingerprint=None):
+    """
+    Returns a function that takes a sequence of words and returns
+    the top_m_paths of the sequence, looking them up in cache first if a
+    DecodeCache is given, in which case the paths are returned as tuples
+    """
+
+    def decode(sequence):
+        return top_m_paths(m, log_emission_scores(sequence, emission_table), transition_matrix)
+
+    if cache is None:
+        return decode
+    return cache.memoize(('top_m', m, fingerprint), lambda sequence: tuple((score, tuple(path)) for score, path in decode(sequence)))
+
+def top_m_viterbi(m, transition_probabilities, emission_probabilities, symbol_counts, observation_sequences, cache=None):
+    """
+    Returns, for every observation sequence, a list of (score, path)
+    tuples of its m highest scoring symbol sequences, best first,
+    where path starts with START.
+    Sequences found in a DecodeCache are not decoded again
+    """
+
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_matrix = compile_transition_matrix(transition_probabilities)
+
+    fingerprint = model_fingerprint(emission_table, transition_matrix) if cache is not None else None
+    decode = top_m_decoder(m, emission_table, transition_matrix, cache, fingerprint)
+
     all_top_m_paths = []
     for sequence in observation_sequences:
-
-        # Initialize probability score and optimal symbol matrices
-        n = len(sequence)
-        scores = {}
-        scores[n+1] = {}
-        for k in range(n + 1):
-            scores[k] = {}
-            for symbol in symbols:
-                scores[k][symbol] = []
-
-        # Set base case
-        for symbol in symbols:
-            scores[0][symbol]= [(0, "NA")]
-            scores[1][symbol] = [(log(transition_probabilities["START"][symbol]) + log(emission_probability(symbol, sequence[0], emission_probabilities, symbol_counts)), "START")]
-        scores[0]["STOP"]= [(0, "NA")]
-        scores[0]["START"]= [(1, "NA")]
-
-        # Move forward recursively
-        for k in range(2, n + 1):
-            for v in symbols:
-                # Get the k highest probability scores and associated previous symbols
-                kth_word = sequence[k-1]
-                probabilities_and_previous_symbols = [(max([score_and_symbol[0] + log(transition_probabilities[u][v]) + log(emission_probability(v, kth_word, emission_probabilities, symbol_counts)) for score_and_symbol in scores[k-1][u]]), u) for u in symbols]
-                # Eliminate duplicate scores
-                probabilities_and_previous_symbols.sort(key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0], reverse=True)
-                scores[k][v] = probabilities_and_previous_symbols[0:m]
-
-        # Final entry
-        probabilities_and_previous_symbols = [(score_and_symbol[0] + log(transition_probabilities[u]["STOP"]), u) for u in symbols for score_and_symbol in scores[k-1][u]]
-        probabilities_and_previous_symbols.sort(key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0], reverse=True)
-        scores[n+1]["STOP"] = probabilities_and_previous_symbols[0:m]
-
-        # Get matrix of top m paths at each step in the sequence
-        # The [k][symbol] element gives a list of tuples of the top-k paths to
-        # the kth observation if it is tagged with symbol, and their score
-        top_m_scores_and_paths= {}
-        top_m_scores_and_paths[n+1] = {}
-        for k in range(1, n + 1):
-            top_m_scores_and_paths[k] = {}
-            for symbol in symbols:
-                top_m_scores_and_paths[k][symbol] = []
-
-        # Set base case
-        for symbol in symbols:
-            top_m_scores_and_paths[1][symbol] = [(log(transition_probabilities["START"][symbol]), ["START"])]
-
-        for k in range(2, n + 1):
-            for v in symbols:
-                kth_word = sequence[k-1]
-                probabilities_and_paths = [(score_and_symbol[0] + score_and_path[0], score_and_path[1] + [score_and_symbol[1]]) for score_and_symbol in scores[k][v] for score_and_path in top_m_scores_and_paths[k-1][score_and_symbol[1]]]
-                # Eliminate duplicate paths
-                probabilities_and_paths = set([(probability_and_path[0], ' '.join(probability_and_path[1])) for probability_and_path in probabilities_and_paths])
-                probabilities_and_paths = [(probability_and_path[0], probability_and_path[1].split()) for probability_and_path in probabilities_and_paths]
-                probabilities_and_paths.sort(key=lambda probability_and_path: probability_and_path[0], reverse=True)
-                top_m_scores_and_paths[k][v] = probabilities_and_paths[0:m]
-
-        # Final entry
-        probabilities_and_paths = [(score_and_symbol[0] + score_and_path[0], score_and_path[1] + [score_and_symbol[1]]) for score_and_symbol in scores[n+1]["STOP"] for score_and_path in top_m_scores_and_paths[n][score_and_symbol[1]]]
-        probabilities_and_paths.sort(key=lambda probability_and_path: probability_and_path[0], reverse=True)
-        top_m_scores_and_paths[n+1]["STOP"] = probabilities_and_paths[0:m]
-
-        all_top_m_paths.append(top_m_scores_and_paths[n+1]["STOP"])
+        all_top_m_paths.append([(score, ["START"] + [symbols[i] for i in path]) for score, path in decode(sequence)])
 
     return all_top_m_paths
 
-def top_m_decode_file(m, training_data, dev_in):
-    symbol_word_counts, symbol_counts = get_symbol_word_counts(training_data)
-    emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
+def top_m_decode_file(m, training_data, dev_in, cache=None):
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_matrix = model.transition_matrix()
 
-    symbol_symbol_counts, symbol_counts = get_symbol_symbol_counts(training_data)
-    transition_probabilities = estimate_transition_params(symbol_symbol_counts, symbol_counts)
+    fingerprint = model.fingerprint() if cache is not None else None
+    decode = top_m_decoder(m, emission_table, transition_matrix, cache, fingerprint)
 
     observation_sequences = get_observation_sequences(dev_in)
-    top_m_paths = top_m_viterbi(m, transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)
+    all_top_m_paths = []
+    for sequence in observation_sequences:
+        top_m = decode(sequence)
+        all_top_m_paths.append([(score, ["START"] + model.tagset.decode(path)) for score, path in top_m])
 
-    return top_m_paths
+    return all_top_m_paths
 
 #  top_m_decode_file(3, 'data/test', 'data/test_dev')
 
 def write_part_4_dev_out(predicted_symbols, dev_in, prediction_file):
-    result_file = open(prediction_file, "w", encoding="utf8")
-    symbols_list = []
-
-    for sequence_symbol in predicted_symbols:
-        symbols = sequence_symbol[-1][1]
-        for symbol in range(1, len(symbols)):
-            symbols_list.append(symbols[symbol])
-        symbols_list.append("")
-
-    with open(dev_in, encoding="utf8") as f:
-        for i,line in enumerate(f):
-            word_label = line.strip() + " " + symbols_list[i] + "\n"
-            result_file.write(word_label)
+    # Write the last, mth best, sequence of every observation sequence
+    write_predicted_symbols((sequence_symbol[-1][1][1:] for sequence_symbol in predicted_symbols), dev_in, prediction_file)
@@ -1,5 +1,10 @@
 import re
-from part_4 import symbols, get_symbol_word_counts, get_symbol_symbol_counts, estimate_emission_params, emission_probability, estimate_transition_params, get_observation_sequences, top_m_viterbi, log
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from writer import write_predicted_symbols
+from shards import find_sentence_shards, open_shard
+from part_4 import symbols, get_symbol_word_counts, get_symbol_symbol_counts, estimate_emission_params, emission_probability, estimate_transition_params, get_observation_sequences, top_m_viterbi, log, compile_emission_table, log_emission_scores, train_model, get_model, model_fingerprint, symbol_index_type
 
 # We try to learn a second order Markov model,
 # where the transition probabilities are now conditioned on the previous two states # instead of just the previous state
@@ -81,124 +86,401 @@ def get_second_order_transition_probabilities(training_data):
     symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts(training_data)
     return estimate_second_order_transition_params(symbol_symbol_symbol_counts, symbol_symbol_counts)
 
-def second_order_viterbi(second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences):
+def compile_second_order_transition_tensor(second_order_transition_probabilities):
+    """
+    Takes a doubly nested dictionary of second order transition probabilities
+    and returns an array of log transition scores
+    where the value of a[i][j][l] is the log score of transitioning
+    from symbols[i], symbols[j] to symbols[l].
+    The last index of the first two axes stands for START
+    and the last index of the third axis for STOP
+    """
+
+    from_symbols = symbols + ['START']
+    to_symbols = symbols + ['STOP']
+    return np.array([[[log(second_order_transition_probabilities.get(symbol1, {}).get(symbol2, {}).get(symbol3, 0)) for symbol3 in to_symbols] for symbol2 in from_symbols] for symbol1 in from_symbols])
+
+def second_order_best_path(emission_scores, transition_tensor):
+    """
+    Takes an array of log emission scores for a sequence
+    (as returned by log_emission_scores) and an array of second order
+    log transition scores (as returned by compile_second_order_transition_tensor)
+    and returns the list of symbol indices of the highest scoring path
+    """
+
+    n = len(emission_scores)
+    transition_scores = transition_tensor[:-1, :-1, :-1]
+
+    # Set base case, the first observation follows START, START
+    first_scores = transition_tensor[-1, -1, :-1] + emission_scores[0]
+    if n == 1:
+        return [int((first_scores + transition_tensor[-1, :-1, -1]).argmax())]
+
+    # The [u][v] element of scores is the score of the best path
+    # whose last two symbols are u, v
+    scores = first_scores[:, None] + transition_tensor[-1, :-1, :-1] + emission_scores[1]
+    previous_symbols = np.zeros((n,) + transition_scores.shape[1:], dtype=symbol_index_type(len(transition_scores)))
+
+    # Move forward recursively, the [w][u][v] element of each step
+    # is the score of reaching u, v at the kth observation from w.
+    # As in part_3.best_path, unseen transitions are scored rather than skipped
+    for k in range(2, n):
+        step_scores = scores[:, :, None] + transition_scores + emission_scores[k]
+        previous_symbols[k] = step_scores.argmax(axis=0)
+        scores = step_scores.max(axis=0)
+
+    # Final entry, get the last two symbols
+    final_scores = scores + transition_tensor[:-1, :-1, -1]
+    last_symbol = int(final_scores.max(axis=0).argmax())
+    path = [last_symbol, int(final_scores[:, last_symbol].argmax())]
+
+    # Given the two subsequent symbols, we can get the current symbol from the back pointers
+    previous_symbols = previous_symbols.tolist()
+    for k in range(n - 1, 1, -1):
+        path.append(previous_symbols[k][path[-1]][path[-2]])
+    path.reverse()
+
+    return path
+
+def second_order_decoder(emission_table, transition_tensor, cache=None, fingerprint=None):
+    """
+    Returns a function that takes a sequence of words and returns
+    its second_order_best_path, looking it up in cache first if a
+    DecodeCache is given, in which case the path is returned as a tuple
+    """
+
+    def decode(sequence):
+        return second_order_best_path(log_emission_scores(sequence, emission_table), transition_tensor)
+
+    if cache is None:
+        return decode
+    return cache.memoize(('second_order', fingerprint), lambda sequence: tuple(decode(sequence)))
+
+def second_order_viterbi(second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences, cache=None):
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_tensor = compile_second_order_transition_tensor(second_order_transition_probabilities)
+
+    fingerprint = model_fingerprint(emission_table, transition_tensor) if cache is not None else None
+    decode = second_order_decoder(emission_table, transition_tensor, cache, fingerprint)
+
     all_predicted_symbols = []
     for sequence in observation_sequences:
-
-        # Initialize probability score and optimal symbol matrix
-        n = len(sequence)
-        scores_and_previous_symbols = {}
-        scores_and_previous_symbols[n+1] = {}
-        for k in range(n + 1):
-            if k == 1:
-                scores_and_previous_symbols[k] = { 'START': {} }
-            else:
-                scores_and_previous_symbols[k] = {}
-            for symbol1 in symbols:
-                scores_and_previous_symbols[k][symbol1] = {}
-                for symbol2 in symbols:
-                    scores_and_previous_symbols[k][symbol1][symbol2] = []
-
-        if len(sequence) == 1:
-            for symbol in symbols:
-                first_observation_transition_probability = symbol_symbol_counts['START'][symbol1]
-                scores_and_previous_symbols[1]['START'][symbol] = (log(first_observation_transition_probability) + log(emission_probability(symbol, sequence[0], emission_probabilities, symbol_counts)), 'START', 'NA')
-            predicted_symbols = ['START', max([(scores_and_previous_symbols[1]['START'][symbol], symbol) for symbol in symbols], key=lambda score_and_previous_symbol : score_and_previous_symbol[0])[1], 'STOP']
-            all_predicted_symbols.append(predicted_symbols)
-            continue
-
-        # Set base case
-        for symbol in symbols:
-            first_observation_transition_probability = symbol_symbol_counts['START'][symbol1]
-            scores_and_previous_symbols[1]['START'][symbol] = (log(first_observation_transition_probability) + log(emission_probability(symbol, sequence[0], emission_probabilities, symbol_counts)), 'START', 'NA')
-        for symbol1 in symbols:
-            for symbol2 in symbols:
-                scores_and_previous_symbols[2][symbol1][symbol2] = (scores_and_previous_symbols[1]['START'][symbol1][0] + log(second_order_transition_probabilities['START'][symbol1][symbol2]) + log(emission_probability(symbol2, sequence[1], emission_probabilities, symbol_counts)), symbol1, 'START')
-
-        # Move forward recursively
-        for k in range(3, n + 1):
-            for v in symbols:
-                for u in symbols:
-                    # Get the max probability score
-                    kth_word = sequence[k-1]
-                    #  for w in symbols:
-                        #  for u in symbols:
-                            #  print(scores_and_previous_symbols[k-1][w][u])
-                    probabilities_and_previous_symbols = [(scores_and_previous_symbols[k-1][w][u][0] + log(second_order_transition_probabilities[w][u][v]) + log(emission_probability(v, kth_word, emission_probabilities, symbol_counts)), u, w) for w in symbols]
-                    scores_and_previous_symbols[k][u][v] = max(probabilities_and_previous_symbols, key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0])
-
-        for u in symbols:
-            probabilities_and_previous_symbols = [(scores_and_previous_symbols[n][w][u][0] + log(second_order_transition_probabilities[w][u]["STOP"]), u, w) for w in symbols]
-            scores_and_previous_symbols[n+1][u] = {}
-            scores_and_previous_symbols[n+1][u]["STOP"] = max(probabilities_and_previous_symbols, key=lambda probability_and_previous_symbol: probability_and_previous_symbol[0])
-
-        # Predict symbol sequence
-
-        # Get last two optimal tags
-        # The last (n+1)th is STOP
-        # From this we can get the tag of the nth observation
-        # by finding the u that gives us the max score
-        predicted_symbols = ["STOP"]
-        max_value = max([scores_and_previous_symbols[n+1][u][predicted_symbols[0]] for u in symbols], key=lambda score_and_previous_symbol: score_and_previous_symbol[0])
-        for u in scores_and_previous_symbols[n+1]:
-            if scores_and_previous_symbols[n+1][u][predicted_symbols[0]]== max_value:
-                predicted_symbols.insert(0, u)
-                break
-
-        # Given the two subsequent symbols, we can get the current symbol from our matrix
-        for k in range(n + 1, 1, -1):
-            predicted_symbols.insert(0, scores_and_previous_symbols[k][predicted_symbols[0]][predicted_symbols[1]][2])
-
-        all_predicted_symbols.append(predicted_symbols)
+        path = decode(sequence)
+        all_predicted_symbols.append(['START'] + [symbols[i] for i in path] + ['STOP'])
 
     return all_predicted_symbols
 
-def decode_file(training_data, dev_in):
-    symbol_word_counts, symbol_counts = get_symbol_word_counts(training_data)
-    emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
+def decode_file(training_data, dev_in, cache=None):
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_tensor = model.second_order_transition_tensor()
 
-    symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts(training_data)
-    second_order_transition_probabilities = estimate_second_order_transition_params(symbol_symbol_symbol_counts, symbol_symbol_counts)
+    fingerprint = model.fingerprint() if cache is not None else None
+    decode = second_order_decoder(emission_table, transition_tensor, cache, fingerprint)
 
     observation_sequences = get_observation_sequences(dev_in)
-    predicted_symbols = second_order_viterbi(second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences)
+    predicted_symbols = []
+    for sequence in observation_sequences:
+        path = decode(sequence)
+        predicted_symbols.append(['START'] + model.tagset.decode(path) + ['STOP'])
 
     # print(predicted_symbols)
     return predicted_symbols
 
+def second_order_top_m_paths(m, emission_scores, transition_tensor):
+    """
+    Second order version of part_4.top_m_paths.
+    Takes an array of log emission scores for a sequence and an array of
+    second order log transition scores and returns a list of up to m
+    (score, path) tuples of the m highest scoring paths, best first,
+    where path is a list of symbol indices.
+    Each state (u, v) of the lattice keeps the scores of its m best partial
+    paths, with a back pointer to the symbol before u and the rank of the path
+    through the previous state
+    """
 
-def pre_process(data_file):
-    with open(data_file+'_processed', 'w', encoding='utf8') as output_f:
-        file_text = ''
-        with open(data_file, encoding='utf8') as f:
-            for line in f:
-                if line.isspace():
-                    file_text += '\n'
-                else:
-                    word = line.split(" ")[0]
-                    if len(line.split())==2:
-                        new = word.lower() + " " + line.split(" ")[1]
-                    else:
-                        new = word.lower()
-                    file_text += new
+    n = len(emission_scores)
+    n_symbols = transition_tensor.shape[-1] - 1
+    START = STOP = n_symbols
+    transition_scores = transition_tensor[:-1, :-1, :-1]
+
+    # Set base case, the first observation follows START, START
+    first_scores = transition_tensor[START, START, :-1] + emission_scores[0]
+    if n == 1:
+        final_scores = first_scores + transition_tensor[START, :-1, STOP]
+        best = np.argsort(-final_scores, kind='stable')[:m]
+        return [(score, [symbol]) for score, symbol in zip(final_scores[best].tolist(), best.tolist())]
+
+    # The [u][v][r] element of scores is the score of the rth best path
+    # whose last two symbols are u, v, or -inf if there are fewer than r + 1
+    scores = np.full((n_symbols, n_symbols, m), -np.inf)
+    scores[:, :, 0] = first_scores[:, None] + transition_tensor[START, :-1, :-1] + emission_scores[1]
+    previous_symbols = np.zeros((n, n_symbols, n_symbols, m), dtype=symbol_index_type(n_symbols))
+    previous_ranks = np.zeros((n, n_symbols, n_symbols, m), dtype=np.int32)
+
+    # Move forward recursively, the [v][x][u, r] element of each step is the score
+    # of reaching v, x from the rth best path through u, v. Ties are broken
+    # by previous symbol and then by rank
+    step_transitions = transition_scores.transpose(1, 2, 0)[:, :, :, None]
+    for k in range(2, n):
+        step_scores = scores.transpose(1, 0, 2)[:, None, :, :] + step_transitions
+        step_scores = (step_scores + emission_scores[k][None, :, None, None]).reshape(n_symbols * n_symbols, -1)
+        best = np.argsort(-step_scores, axis=1, kind='stable')[:, :m]
+        scores = np.take_along_axis(step_scores, best, axis=1).reshape(n_symbols, n_symbols, m)
+        previous_symbols[k], previous_ranks[k] = (a.reshape(n_symbols, n_symbols, m) for a in np.divmod(best, m))
+
+    # Final entry, the best states and ranks over all (u, v, r)
+    final_scores = (scores + transition_tensor[:-1, :-1, STOP, None]).ravel()
+    best = np.argsort(-final_scores, kind='stable')[:m]
+    best = best[final_scores[best] > -np.inf]
+
+    # Follow the back pointers of all the returned paths at once
+    paths = np.zeros((n, len(best)), dtype=symbol_index_type(n_symbols))
+    current_states, current_ranks = np.divmod(best, m)
+    previous, current = np.divmod(current_states, n_symbols)
+    paths[n - 1], paths[n - 2] = current, previous
+    for k in range(n - 1, 1, -1):
+        before = previous_symbols[k, previous, current, current_ranks]
+        current_ranks = previous_ranks[k, previous, current, current_ranks]
+        previous, current = before, previous
+        paths[k - 2] = previous
+
+    return list(zip(final_scores[best].tolist(), paths.T.tolist()))
+
+def second_order_top_m_viterbi(m, second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences):
+    """
+    Takes m followed by the arguments of second_order_viterbi and returns,
+    for every observation sequence, a list of (score, path) tuples of its
+    m highest scoring symbol sequences under the second order model,
+    best first, where path starts with START, like part_4.top_m_viterbi
+    """
 
-        processed_text = re.sub('@(\w+)', r'\1', file_text)
-        processed_text = re.sub('#(\w+)', r'\1', processed_text)
-        output_f.write(processed_text)
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_tensor = compile_second_order_transition_tensor(second_order_transition_probabilities)
 
-def add_predicted_symbols_to_file(predicted_symbols, dev_in, prediction_file):
-    result_file = open(prediction_file, "w", encoding="utf8")
-    symbols_list = []
-    for sequence_symbol in predicted_symbols:
-        for symbol in sequence_symbol:
-            if symbol != "START":
-                if symbol == "STOP":
-                    symbols_list.append("")
-                else:
-                    symbols_list.append(symbol)
+    all_top_m_paths = []
+    for sequence in observation_sequences:
+        top_m = second_order_top_m_paths(m, log_emission_scores(sequence, emission_table), transition_tensor)
+        all_top_m_paths.append([(score, ["START"] + [symbols[i] for i in path]) for score, path in top_m])
+
+    return all_top_m_paths
+
+def second_order_top_m_decode_file(m, training_data, dev_in):
+    """
+    Same as part_4.top_m_decode_file with the second order model,
+    so the result can be written with part_4.write_part_4_dev_out
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_tensor = model.second_order_transition_tensor()
+
+    all_top_m_paths = []
+    for sequence in get_observation_sequences(dev_in):
+        top_m = second_order_top_m_paths(m, log_emission_scores(sequence, emission_table), transition_tensor)
+        all_top_m_paths.append([(score, ["START"] + model.tagset.decode(path)) for score, path in top_m])
+
+    return all_top_m_paths
+
+def prune_beam(scores, beam_width=None, threshold=None):
+    """
+    Returns the sorted indices of the scores kept in the beam:
+    the beam_width highest, and only those within threshold of the best.
+    Ties are broken by index
+    """
+
+    if threshold is not None:
+        kept = np.flatnonzero(scores >= scores.max() - threshold)
+    else:
+        kept = np.arange(len(scores))
+    if beam_width is not None and len(kept) > beam_width:
+        kept = np.sort(kept[np.argsort(-scores[kept], kind='stable')[:beam_width]])
+    return kept
+
+def second_order_beam_path(emission_scores, transition_tensor, beam_width=None, threshold=None):
+    """
+    Approximate second_order_best_path that only extends the states (u, v)
+    (the last two symbols) kept in the beam at each observation, see prune_beam.
+    The work per observation is proportional to the beam width times the
+    number of symbols, instead of the number of symbols cubed.
+    Without beam_width and threshold, every state is kept and the best path is found
+    """
+
+    n = len(emission_scores)
+    n_symbols = transition_tensor.shape[-1] - 1
+    START = STOP = n_symbols
+    symbol_range = np.arange(n_symbols)
+
+    # The active states are parallel arrays of previous symbols u, symbols v
+    # and scores, sorted by (v, u). The first observation follows START, START
+    previous = np.full(n_symbols, START)
+    current = symbol_range
+    scores = transition_tensor[START, START, :-1] + emission_scores[0]
+    kept = prune_beam(scores, beam_width, threshold)
+    previous, current, scores = previous[kept], current[kept], scores[kept]
+    symbols_at = [current]
+    back_pointers = []
+
+    for k in range(1, n):
+        # The [a][x] element is the score of extending the ath state (u, v) to (v, x)
+        step_scores = (scores[:, None] + transition_tensor[previous, current, :-1]) + emission_scores[k]
+
+        # States with the same v are contiguous, keep the best extension of each group,
+        # breaking ties by the earlier u
+        starts = np.flatnonzero(np.r_[True, current[1:] != current[:-1]])
+        best_scores = np.maximum.reduceat(step_scores, starts, axis=0)
+        is_best = step_scores == np.repeat(best_scores, np.diff(np.r_[starts, len(current)]), axis=0)
+        parents = np.minimum.reduceat(np.where(is_best, np.arange(len(current))[:, None], len(current)), starts, axis=0)
+
+        # The new states (v, x), transposed so that they are sorted by (x, v)
+        step_previous = np.broadcast_to(current[starts][:, None], best_scores.shape).T.ravel()
+        step_current = np.broadcast_to(symbol_range, best_scores.shape).T.ravel()
+        step_scores = best_scores.T.ravel()
+
+        kept = prune_beam(step_scores, beam_width, threshold)
+        previous, current, scores = step_previous[kept], step_current[kept], step_scores[kept]
+        symbols_at.append(current)
+        back_pointers.append(parents.T.ravel()[kept])
+
+    # Final entry, then follow the back pointers
+    state = int((scores + transition_tensor[previous, current, STOP]).argmax())
+    path = [int(symbols_at[-1][state])]
+    for k in range(n - 1, 0, -1):
+        state = back_pointers[k - 1][state]
+        path.append(int(symbols_at[k - 1][state]))
+    path.reverse()
+
+    return path
+
+def second_order_beam_viterbi(second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences, beam_width=None, threshold=None):
+    """
+    Same as second_order_viterbi, with the same arguments followed by the
+    beam_width and threshold of the beam search of second_order_beam_path
+    """
 
-    with open(dev_in, encoding="utf8") as f:
-        for i, line in enumerate(f):
-            word_label = line.strip() + " " + symbols_list[i] + "\n"
-            result_file.write(word_label)
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    transition_tensor = compile_second_order_transition_tensor(second_order_transition_probabilities)
+
+    all_predicted_symbols = []
+    for sequence in observation_sequences:
+        path = second_order_beam_path(log_emission_scores(sequence, emission_table), transition_tensor, beam_width, threshold)
+        all_predicted_symbols.append(['START'] + [symbols[i] for i in path] + ['STOP'])
+
+    return all_predicted_symbols
+
+def beam_decode_file(training_data, dev_in, beam_width=None, threshold=None):
+    """
+    Same as decode_file, with the beam search of second_order_beam_path
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_tensor = model.second_order_transition_tensor()
+
+    predicted_symbols = []
+    for sequence in get_observation_sequences(dev_in):
+        path = second_order_beam_path(log_emission_scores(sequence, emission_table), transition_tensor, beam_width, threshold)
+        predicted_symbols.append(['START'] + model.tagset.decode(path) + ['STOP'])
+
+    return predicted_symbols
+
+def beam_agreement(training_data, dev_in, beam_width=None, threshold=None):
+    """
+    Decodes dev_in with both second_order_best_path and second_order_beam_path
+    and returns a dictionary of how often they agree and how long each took:
+    the fraction of sequences and of symbols the beam search got the same
+    as the exact search, and the decoding times in seconds
+    """
+
+    model = get_model(training_data)
+    emission_table = model.emission_table()
+    transition_tensor = model.second_order_transition_tensor()
+    all_emission_scores = [log_emission_scores(sequence, emission_table) for sequence in get_observation_sequences(dev_in)]
+
+    start = time.perf_counter()
+    exact_paths = [second_order_best_path(emission_scores, transition_tensor) for emission_scores in all_emission_scores]
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    beam_paths = [second_order_beam_path(emission_scores, transition_tensor, beam_width, threshold) for emission_scores in all_emission_scores]
+    beam_time = time.perf_counter() - start
+
+    matching_symbols = sum(int((np.array(exact) == np.array(beam)).sum()) for exact, beam in zip(exact_paths, beam_paths))
+    return {
+        'sequences': len(exact_paths),
+        'sequence_agreement': sum(exact == beam for exact, beam in zip(exact_paths, beam_paths)) / max(len(exact_paths), 1),
+        'symbol_agreement': matching_symbols / max(sum(len(path) for path in exact_paths), 1),
+        'exact_time': exact_time,
+        'beam_time': beam_time,
+    }
+
+
+# Mentions and hashtags lose their @ and #
+mention_pattern = re.compile(r'@(\w+)')
+hashtag_pattern = re.compile(r'#(\w+)')
+
+def pre_process_lines(lines):
+    """
+    Returns the lowercased text of a list of lines of a data file,
+    before mentions and hashtags are removed
+    """
+
+    pieces = []
+    for line in lines:
+        if line.isspace():
+            pieces.append('\n')
+        else:
+            words = line.split(" ")
+            if len(line.split())==2:
+                pieces.append(words[0].lower() + " " + words[1])
+            else:
+                pieces.append(words[0].lower())
+
+    return ''.join(pieces)
+
+def pre_process_text(text):
+    return hashtag_pattern.sub(r'\1', mention_pattern.sub(r'\1', text))
+
+def iter_pre_processed(f, buffer_size=1 << 20):
+    """
+    Yields the processed text of an open data file, about buffer_size
+    characters at a time. Mentions and hashtags never span a newline,
+    so each chunk is processed up to its last newline and the rest
+    is carried over to the next chunk
+    """
+
+    carry = ''
+    for lines in iter(lambda: f.readlines(buffer_size), []):
+        text = carry + pre_process_lines(lines)
+        end = text.rfind('\n') + 1
+        carry = text[end:]
+        yield pre_process_text(text[:end])
+    yield pre_process_text(carry)
+
+def pre_process_shard(data_file, start, end):
+    """
+    Returns the processed text of the bytes start to end of data_file
+    """
+
+    return ''.join(iter_pre_processed(open_shard(data_file, start, end)))
+
+def pre_process(data_file, processes=1, shard_size=1 << 24):
+    """
+    Writes data_file with lowercased words and without the @ of mentions
+    and the # of hashtags to data_file + '_processed'.
+    With more than one process, the file is split into sentence aligned
+    shards of about shard_size bytes that are processed in parallel
+    """
+
+    with open(data_file+'_processed', 'w', encoding='utf8') as output_f:
+        if processes == 1:
+            with open(data_file, encoding='utf8') as f:
+                output_f.writelines(iter_pre_processed(f))
+        else:
+            shards = find_sentence_shards(data_file, shard_size)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                output_f.writelines(executor.map(pre_process_shard, [data_file] * len(shards), *zip(*shards)))
+
+def add_predicted_symbols_to_file(predicted_symbols, dev_in, prediction_file):
+    write_predicted_symbols((sequence_symbol[1:-1] for sequence_symbol in predicted_symbols), dev_in, prediction_file)
 
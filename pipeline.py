@@ -0,0 +1,101 @@
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from part_3 import stream_decode_file as stream_decode_file_3
+from part_4 import top_m_decode_file, write_part_4_dev_out as write_to_file_4
+from part_5 import decode_file as decode_file_5, add_predicted_symbols_to_file as write_to_file_5
+
+# A job trains a part's model on training_data, decodes decode_in
+# and writes the predictions next to the words of dev_in to output_file.
+# decode_in differs from dev_in when decoding preprocessed input
+Job = namedtuple('Job', ['language', 'part', 'training_data', 'decode_in', 'dev_in', 'output_file'])
+
+# Part 4 writes the mth best sequence
+TOP_M = 5
+
+def default_jobs():
+    """
+    Returns the jobs that write every output file of the project
+    """
+
+    jobs = []
+    for language in ['EN', 'ES', 'CN', 'SG']:
+        jobs.append(Job(language, 'p3', 'data/%s/train' % language, 'data/%s/dev.in' % language, 'data/%s/dev.in' % language, 'output/%s/dev.p3.out' % language))
+
+    for language in ['EN', 'ES']:
+        jobs.append(Job(language, 'p4', 'data/%s/train' % language, 'data/%s/dev.in' % language, 'data/%s/dev.in' % language, 'output/%s/dev.p4.out' % language))
+        jobs.append(Job(language, 'p4', 'data/%s/train_processed' % language, 'data/%s/dev.in_processed' % language, 'data/%s/dev.in' % language, 'output/%s/dev.p4_processed.out' % language))
+        jobs.append(Job(language, 'p5', 'data/%s/train_processed' % language, 'data/%s/dev.in_processed' % language, 'data/%s/dev.in' % language, 'output/%s/dev.p5.out' % language))
+        jobs.append(Job(language, 'p5', 'data/%s/train_processed' % language, 'data/p5_test/%s/test.in_processed' % language, 'data/p5_test/%s/test.in' % language, 'output/%s/test.p5.out' % language))
+
+    return jobs
+
+def job_size(job):
+    """
+    Returns an estimate of the work of a job, used to start the biggest jobs first
+    """
+
+    return os.path.getsize(job.training_data) + os.path.getsize(job.decode_in)
+
+def run_job(job):
+    """
+    Runs a job and returns its wall time in seconds
+    """
+
+    start = time.perf_counter()
+    output_directory = os.path.dirname(job.output_file)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+
+    if job.part == 'p3':
+        if job.decode_in != job.dev_in:
+            raise ValueError("Part 3 decodes the words it writes, so decode_in must be dev_in")
+        stream_decode_file_3(job.training_data, job.decode_in, job.output_file)
+    elif job.part == 'p4':
+        write_to_file_4(top_m_decode_file(TOP_M, job.training_data, job.decode_in), job.dev_in, job.output_file)
+    elif job.part == 'p5':
+        write_to_file_5(decode_file_5(job.training_data, job.decode_in), job.dev_in, job.output_file)
+    else:
+        raise ValueError("Unknown part %s" % job.part)
+
+    return time.perf_counter() - start
+
+def run_pipeline(jobs=None, workers=None, report=print):
+    """
+    Runs jobs (all the default jobs if None) in a pool of worker processes,
+    biggest first, calling report with a line for every finished job.
+    Returns a list of (job, wall time in seconds) tuples in order of completion
+    """
+
+    if jobs is None:
+        jobs = default_jobs()
+    jobs = sorted(jobs, key=job_size, reverse=True)
+
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(run_job, job): job for job in jobs }
+        for future in as_completed(futures):
+            job = futures[future]
+            timings.append((job, future.result()))
+            if report is not None:
+                report('%s %s %s: %.2fs' % (job.language, job.part, job.output_file, timings[-1][1]))
+
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the output files of every language and part in parallel")
+    parser.add_argument('--languages', nargs='+', help="only run the jobs of these languages")
+    parser.add_argument('--parts', nargs='+', choices=['p3', 'p4', 'p5'], help="only run the jobs of these parts")
+    parser.add_argument('--workers', type=int, help="number of worker processes, defaults to the number of cores")
+    args = parser.parse_args(argv)
+
+    jobs = [job for job in default_jobs() if (args.languages is None or job.language in args.languages) and (args.parts is None or job.part in args.parts)]
+
+    start = time.perf_counter()
+    run_pipeline(jobs, args.workers)
+    print('Total: %.2fs' % (time.perf_counter() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import io
+import os
+
+def find_sentence_shards(data_file, shard_size):
+    """
+    Returns a list of (start, end) byte offsets that split data_file
+    into shards of about shard_size bytes, each ending after a blank line
+    (or at the end of the file), so no sentence is split between shards
+    """
+
+    size = os.path.getsize(data_file)
+    shards = []
+    with open(data_file, 'rb') as f:
+        start = 0
+        while start < size:
+            end = size
+            if start + shard_size < size:
+                # Finish the line we land in, then look for the next blank line
+                f.seek(start + shard_size)
+                f.readline()
+                for line in iter(f.readline, b''):
+                    if line.isspace():
+                        end = f.tell()
+                        break
+            shards.append((start, end))
+            start = end
+
+    return shards
+
+def open_shard(data_file, start, end):
+    """
+    Returns a text file object of the bytes start to end of data_file,
+    read the same way as open(data_file, encoding='utf8')
+    """
+
+    with open(data_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf8')
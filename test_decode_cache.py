@@ -0,0 +1,46 @@
+from decode_cache import DecodeCache
+from part_2 import get_symbol_word_counts, get_emission_probabilities
+from part_3 import get_transition_probabilities, get_observation_sequences, viterbi
+
+def test_decode_cache():
+    cache = DecodeCache(max_size=2)
+    decoded = []
+    decode = cache.memoize('test', lambda sequence: decoded.append(sequence) or tuple(sequence))
+
+    assert decode(['a']) == ('a',)
+    assert decode(['b']) == ('b',)
+    assert decode(['a']) == ('a',)
+    # 'b' is the least recently used entry, so it is evicted
+    assert decode(['c']) == ('c',)
+    assert decode(['b']) == ('b',)
+    assert decoded == [['a'], ['b'], ['c'], ['b']]
+    assert (cache.hits, cache.misses, len(cache)) == (1, 4, 2)
+    assert ('test', ('a',)) not in cache
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+def test_decode_all():
+    cache = DecodeCache()
+    batches = []
+    def batch_decode(sequences):
+        batches.append(sequences)
+        return [tuple(sequence) for sequence in sequences]
+
+    assert cache.decode_all('test', [['a'], ['b'], ['a']], batch_decode) == [('a',), ('b',), ('a',)]
+    assert cache.decode_all('test', [['b'], ['c']], batch_decode) == [('b',), ('c',)]
+    assert cache.decode_all('other', [['b']], batch_decode) == [('b',)]
+    assert batches == [[['a'], ['b']], [['c']], [['b']]]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+def test_cached_viterbi():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_probabilities = get_emission_probabilities('data/test')
+    transition_probabilities = get_transition_probabilities('data/test')
+    sequence = get_observation_sequences('data/test_dev')[0]
+    observation_sequences = [sequence, sequence[:3], sequence, sequence[:3]]
+
+    cache = DecodeCache()
+    expected = viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)
+    assert viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences, cache) == expected
+    assert (cache.hits, cache.misses) == (2, 2)
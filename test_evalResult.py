@@ -0,0 +1,17 @@
+from evalResult import get_observed, get_predicted, main
+from evaluation import iter_sentence_spans
+
+def test_get_observed_and_predicted():
+    for read_spans in [get_observed, get_predicted]:
+        spans = read_spans(open('data/EN/dev.p4.out', encoding='utf8'))
+        expected = list(iter_sentence_spans(open('data/EN/dev.p4.out', encoding='utf8')))
+        assert [{ (span[1], len(span) - 1): span[0] for span in spans[example] } for example in spans] == expected
+
+def test_main(tmp_path, capsys):
+    results = main(['evalscript/dev.out', 'evalscript/dev.prediction'])
+    assert len(results) == 1 and results[0]['correct_entity'] == 2
+    assert '#Correct Entity : 2' in capsys.readouterr().out
+
+    main(['data/EN/dev.out', 'data/EN/dev.p3.out', 'data/EN/dev.p4.out', '--json', str(tmp_path / 'results.json')])
+    assert capsys.readouterr().out == ''
+    assert (tmp_path / 'results.json').exists()
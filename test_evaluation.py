@@ -0,0 +1,87 @@
+import csv
+import json
+import numpy as np
+import pytest
+from evaluation import RESULT_FIELDS, iter_sentence_spans, count_matches, evaluate, evaluate_all, write_results_json, write_results_csv, read_gold_tag_ids, evaluate_tag_ids, evaluate_paths, confusion_matrix, evaluate_tags
+from vocabulary import TagSet
+from part_2 import symbols
+
+def test_iter_sentence_spans():
+    lines = ['Donald B-positive\n', 'Trump I-negative\n', 'won I-positive\n', 'the O\n', 'USA B-neutral\n', 'in O\n', '2016 B-positive\n', '\n', '## comment\n', 'A I-neutral\n', 'B I-neutral\n']
+    assert list(iter_sentence_spans(lines)) == [
+        { (0, 1): 'positive', (1, 1): 'negative', (2, 1): 'positive', (4, 1): 'neutral', (6, 1): 'positive' },
+        { (0, 2): 'neutral' },
+    ]
+
+def test_count_matches():
+    observed = [{ (0, 2): 'positive', (6, 1): 'neutral' }, { (1, 1): 'negative' }, {}]
+    predicted = [{ (0, 1): 'positive', (6, 1): 'neutral' }, { (1, 1): 'positive' }]
+    assert count_matches(observed, predicted) == { 'observed': 3, 'predicted': 3, 'correct_entity': 2, 'correct_sentiment': 1 }
+    # Predicted sentences past the gold data are ignored
+    assert count_matches(observed[:1], predicted)['predicted'] == 2
+
+def test_evaluate():
+    results = evaluate('evalscript/dev.out', 'evalscript/dev.prediction')
+    assert (results['observed'], results['predicted'], results['correct_entity'], results['correct_sentiment']) == (3, 8, 2, 1)
+    assert results['entity_precision'] == 2/8 and results['sentiment_recall'] == 1/3
+
+    results = evaluate('data/EN/dev.out', 'data/EN/dev.out')
+    assert results['entity_f'] == results['sentiment_f'] == 1
+
+def test_evaluate_all(tmp_path):
+    predictions = { 'data/EN/dev.out': ['data/EN/dev.p2.out', 'data/EN/dev.p3.out'], 'evalscript/dev.out': ['evalscript/dev.prediction'] }
+    expected = [evaluate(gold_file, prediction_file) for gold_file, prediction_files in predictions.items() for prediction_file in prediction_files]
+
+    for processes in [1, 2]:
+        results = evaluate_all(predictions, processes)
+        assert [row['prediction_file'] for row in results] == ['data/EN/dev.p2.out', 'data/EN/dev.p3.out', 'evalscript/dev.prediction']
+        assert [{ name: value for name, value in row.items() if not name.endswith('_file') } for row in results] == expected
+
+    write_results_json(results, str(tmp_path / 'results.json'))
+    assert json.load(open(str(tmp_path / 'results.json'))) == results
+    write_results_csv(results, str(tmp_path / 'results.csv'))
+    rows = list(csv.DictReader(open(str(tmp_path / 'results.csv'))))
+    assert list(rows[0]) == RESULT_FIELDS and rows[2]['correct_entity'] == '2'
+
+def test_evaluate_tag_ids():
+    tagset = TagSet(symbols)
+    for language, prediction_file in [('EN', 'dev.p4.out'), ('CN', 'dev.p2.out'), ('SG', 'dev.p3.out')]:
+        gold_file = 'data/%s/dev.out' % language
+        results = evaluate_tag_ids(*read_gold_tag_ids(gold_file, tagset), *read_gold_tag_ids('data/%s/%s' % (language, prediction_file), tagset), tagset)
+        assert results == evaluate(gold_file, 'data/%s/%s' % (language, prediction_file))
+
+def test_evaluate_paths():
+    tagset = TagSet(symbols)
+    tag_ids, lengths = read_gold_tag_ids('data/test', tagset)
+    paths = [tag_ids.tolist()]
+    assert evaluate_paths(tag_ids, lengths, paths, tagset)['sentiment_f'] == 1
+
+    # The second word is left out, which shortens the first entity
+    # and shifts the others back by one
+    sequences = [['A', '##B', 'C', 'C', 'C', 'A', 'B', 'A', 'B', 'C', 'D', 'C']]
+    results = evaluate_paths(tag_ids, lengths, paths, tagset, sequences)
+    assert (results['observed'], results['predicted'], results['correct_entity']) == (3, 3, 0)
+
+def test_confusion_matrix():
+    assert confusion_matrix(np.array([0, 1, 1, 2]), np.array([0, 1, 2, 2]), 3).tolist() == [[1, 0, 0], [0, 1, 1], [0, 0, 1]]
+    with pytest.raises(ValueError):
+        confusion_matrix(np.array([0, 1]), np.array([0]), 3)
+
+def test_tag_report():
+    tagset = TagSet(symbols)
+    report = evaluate_tags('data/SG/dev.out', 'data/SG/dev.p3.out', tagset)
+    results = evaluate('data/SG/dev.out', 'data/SG/dev.p3.out')
+
+    assert np.array(report['confusion']).sum() == sum(tag['observed'] for tag in report['tags'].values())
+    assert report['accuracy'] == sum(tag['correct'] for tag in report['tags'].values()) / np.array(report['confusion']).sum()
+    assert sum(sentiment['correct'] for sentiment in report['sentiments'].values()) == results['correct_sentiment']
+    assert sum(sentiment['predicted'] for sentiment in report['sentiments'].values()) == results['predicted']
+    assert json.loads(json.dumps(report)) == report
+
+    report = evaluate_tags('data/test', 'data/test', tagset)
+    assert report['accuracy'] == 1
+    assert report['tags']['O'] == { 'observed': 7, 'predicted': 7, 'correct': 7, 'precision': 1, 'recall': 1, 'f': 1 }
+    assert report['sentiments']['neutral']['correct'] == 2 and report['sentiments']['negative']['f'] == 0
+
+    with pytest.raises(ValueError):
+        evaluate_tags('data/EN/dev.out', 'data/ES/dev.out', tagset)
@@ -0,0 +1,47 @@
+from itertools import product
+import numpy as np
+from part_2 import get_symbol_word_counts, get_emission_probabilities
+from part_3 import symbols, get_transition_probabilities, compile_emission_table, compile_transition_matrix, log_emission_scores, get_observation_sequences
+from forward_backward import forward_backward, batch_posteriors, posterior_path
+
+def compile_test_model():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_table = compile_emission_table(get_emission_probabilities('data/test'), symbol_counts)
+    transition_matrix = compile_transition_matrix(get_transition_probabilities('data/test'))
+    return emission_table, transition_matrix
+
+def test_forward_backward():
+    emission_table, transition_matrix = compile_test_model()
+    START = STOP = len(symbols)
+
+    for sequence in [['A'], ['A', 'B'], ['C', 'A', 'U'], ['B', 'C', 'D', 'C']]:
+        emission_scores = log_emission_scores(sequence, emission_table)
+        # Sum the probability of every possible path
+        path_probabilities = {}
+        for path in product(range(len(symbols)), repeat=len(sequence)):
+            padded_path = [START] + list(path) + [STOP]
+            score = sum(transition_matrix[padded_path[k]][padded_path[k+1]] for k in range(len(padded_path) - 1))
+            score += sum(emission_scores[k][path[k]] for k in range(len(path)))
+            path_probabilities[path] = np.exp(score)
+        likelihood = sum(path_probabilities.values())
+        expected = np.zeros((len(sequence), len(symbols)))
+        for path, probability in path_probabilities.items():
+            expected[np.arange(len(path)), path] += probability / likelihood
+
+        posteriors, log_likelihood = forward_backward(emission_scores, transition_matrix)
+        assert np.allclose(posteriors, expected)
+        assert np.isclose(log_likelihood, np.log(likelihood))
+
+def test_batch_posteriors():
+    emission_table, transition_matrix = compile_test_model()
+    sequence = get_observation_sequences('data/test_dev')[0]
+    observation_sequences = [sequence, sequence[:1], sequence[3:8], ['U', 'A'], sequence[:2]]
+
+    for batch_size in [1, 2, 256]:
+        all_posteriors = batch_posteriors(observation_sequences, emission_table, transition_matrix, batch_size)
+        for sequence, posteriors in zip(observation_sequences, all_posteriors):
+            assert np.allclose(posteriors, forward_backward(log_emission_scores(sequence, emission_table), transition_matrix)[0])
+            assert np.allclose(posteriors.sum(axis=1), 1)
+
+def test_posterior_path():
+    assert posterior_path(np.array([[0.1, 0.9], [0.6, 0.4]])) == [1, 0]
@@ -0,0 +1,165 @@
+from part_2 import get_symbol_word_counts, estimate_emission_params
+from part_3 import get_symbol_symbol_counts, estimate_transition_params, compile_emission_table, log_emission_scores, compile_transition_matrix
+from part_5 import get_symbol_symbol_symbol_counts, estimate_second_order_transition_params, compile_second_order_transition_tensor
+from vocabulary import TagSet
+import shutil
+import numpy as np
+import pytest
+from part_3 import get_observation_sequences, batch_best_paths
+from model import MODEL_FILE_MAGIC, HMMModel, train_model, save_model, load_model, model_cache_key, get_model, clear_model_cache
+
+def test_train_model():
+    for training_file, buffer_size in [('data/test', 1), ('data/test', 20), ('data/EN/train', 1 << 12), ('data/EN/train', 1 << 20)]:
+        model = train_model(training_file, buffer_size=buffer_size)
+        tagset, vocabulary = model.tagset, model.vocabulary
+
+        symbol_word_counts, symbol_counts = get_symbol_word_counts(training_file)
+        for symbol in symbol_word_counts:
+            for word, count in symbol_word_counts[symbol].items():
+                assert model.emission_counts[tagset.id(symbol), vocabulary.id(word)] == count
+        assert model.emission_counts.sum() == sum(symbol_counts.values())
+
+        symbol_symbol_counts = get_symbol_symbol_counts(training_file)[0]
+        for symbol1 in symbol_symbol_counts:
+            for symbol2, count in symbol_symbol_counts[symbol1].items():
+                assert model.transition_counts[tagset.id(symbol1), tagset.id(symbol2)] == count
+        assert model.transition_counts.sum() == sum(sum(counts.values()) for counts in symbol_symbol_counts.values())
+
+        symbol_symbol_symbol_counts = get_symbol_symbol_symbol_counts(training_file)[0]
+        for symbol1 in symbol_symbol_symbol_counts:
+            for symbol2 in symbol_symbol_symbol_counts[symbol1]:
+                for symbol3, count in symbol_symbol_symbol_counts[symbol1][symbol2].items():
+                    assert model.second_order_counts[tagset.id(symbol1), tagset.id(symbol2), tagset.id(symbol3)] == count
+        assert model.second_order_counts.sum() == sum(sum(counts.values()) for counts1 in symbol_symbol_symbol_counts.values() for counts in counts1.values())
+
+def test_train_model_sharded():
+    for training_file, shard_size in [('data/test', 1), ('data/test', 20), ('data/EN/train', 1 << 14)]:
+        model = train_model(training_file)
+        sharded_model = train_model(training_file, processes=2, shard_size=shard_size)
+
+        assert sharded_model.vocabulary.words == model.vocabulary.words
+        assert np.array_equal(sharded_model.emission_counts, model.emission_counts)
+        assert np.array_equal(sharded_model.transition_counts, model.transition_counts)
+        assert np.array_equal(sharded_model.second_order_counts, model.second_order_counts)
+
+def test_compiled_model():
+    model = train_model('data/EN/train')
+
+    symbol_word_counts, symbol_counts = get_symbol_word_counts('data/EN/train')
+    emission_table = compile_emission_table(estimate_emission_params(symbol_word_counts, symbol_counts), symbol_counts)
+    words = list(symbol_word_counts['O']) + ['unseen word']
+    assert (log_emission_scores(words, model.emission_table()) == log_emission_scores(words, emission_table)).all()
+
+    symbol_symbol_counts, symbol_counts = get_symbol_symbol_counts('data/EN/train')
+    assert (model.transition_matrix() == compile_transition_matrix(estimate_transition_params(symbol_symbol_counts, symbol_counts))).all()
+
+    symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts('data/EN/train')
+    assert (model.second_order_transition_tensor() == compile_second_order_transition_tensor(estimate_second_order_transition_params(symbol_symbol_symbol_counts, symbol_symbol_counts))).all()
+
+def test_tagset():
+    model = train_model('data/test', TagSet(['O', 'B-neutral', 'I-neutral', 'B-positive']))
+
+    assert model.emission_counts.shape == (4, 4)
+    assert model.transition_matrix().shape == (5, 5)
+    assert model.second_order_transition_tensor().shape == (5, 5, 5)
+    assert model.emission_counts[model.tagset.id('O'), model.vocabulary.id('C')] == 5
+
+def test_save_and_load_model(tmp_path):
+    model = train_model('data/EN/train')
+    save_model(model, tmp_path / 'EN.hmm')
+    loaded_model = load_model(tmp_path / 'EN.hmm')
+
+    assert loaded_model.tagset == model.tagset
+    assert loaded_model.vocabulary.words == model.vocabulary.words
+    assert isinstance(loaded_model.transition_matrix(), np.memmap)
+    assert (loaded_model.emission_counts == model.emission_counts).all()
+    assert (loaded_model.transition_counts == model.transition_counts).all()
+    assert (loaded_model.second_order_counts == model.second_order_counts).all()
+    assert (loaded_model.emission_table()[1] == model.emission_table()[1]).all()
+    assert (loaded_model.second_order_transition_tensor() == model.second_order_transition_tensor()).all()
+
+    observation_sequences = get_observation_sequences('data/EN/dev.in')
+    assert batch_best_paths(observation_sequences, loaded_model.emission_table(), loaded_model.transition_matrix()) == batch_best_paths(observation_sequences, model.emission_table(), model.transition_matrix())
+
+def test_load_model_version(tmp_path):
+    save_model(train_model('data/test'), tmp_path / 'test.hmm')
+    with open(tmp_path / 'test.hmm', 'r+b') as f:
+        f.seek(len(MODEL_FILE_MAGIC))
+        f.write((99).to_bytes(4, 'little'))
+
+    with pytest.raises(ValueError):
+        load_model(tmp_path / 'test.hmm')
+
+def test_get_model(tmp_path):
+    training_file = tmp_path / 'train'
+    cache_dir = tmp_path / 'cache'
+    shutil.copy('data/test', training_file)
+    clear_model_cache()
+
+    # Trained once, then reused from memory
+    model = get_model(training_file, cache_dir=cache_dir)
+    assert get_model(training_file, cache_dir=cache_dir) is model
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # Reused from disk by a new process
+    clear_model_cache()
+    cached_model = get_model(training_file, cache_dir=cache_dir)
+    assert cached_model is not model
+    assert isinstance(cached_model.transition_matrix(), np.memmap)
+    assert (cached_model.transition_matrix() == model.transition_matrix()).all()
+
+    # Settings and content are part of the key
+    assert model_cache_key(training_file, TagSet(['O', 'B-neutral', 'I-neutral', 'B-positive'])) != model_cache_key(training_file)
+    key = model_cache_key(training_file)
+    with open(training_file, 'a', encoding='utf8') as f:
+        f.write('\nD O\n')
+    assert model_cache_key(training_file) != key
+    assert get_model(training_file, cache_dir=cache_dir).emission_counts.sum() == model.emission_counts.sum() + 1
+    clear_model_cache()
+
+def test_update_model(tmp_path):
+    with open(str(tmp_path / 'train'), 'w', encoding='utf8') as f:
+        f.write(open('data/EN/train', encoding='utf8').read() + open('data/test', encoding='utf8').read())
+    expected = train_model(str(tmp_path / 'train'))
+
+    model = train_model('data/EN/train')
+    save_model(model, str(tmp_path / 'model.hmm'))
+    for model in [model, load_model(str(tmp_path / 'model.hmm'))]:
+        fingerprint = model.fingerprint()
+        emission_counts = np.array(model.emission_counts)
+        updated_model = model.update('data/test')
+
+        # The model itself is left unchanged
+        assert np.array_equal(model.emission_counts, emission_counts) and model.fingerprint() == fingerprint
+        model = updated_model
+
+        assert model.vocabulary.words == expected.vocabulary.words
+        assert model.last_tags == expected.last_tags
+        assert np.array_equal(model.emission_counts, expected.emission_counts)
+        assert np.array_equal(model.transition_counts, expected.transition_counts)
+        assert np.array_equal(model.second_order_counts, expected.second_order_counts)
+        assert np.array_equal(model.emission_table()[1], expected.emission_table()[1])
+        assert np.array_equal(model.transition_matrix(), expected.transition_matrix())
+        assert np.array_equal(model.second_order_transition_tensor(), expected.second_order_transition_tensor())
+        assert model.fingerprint() == expected.fingerprint()
+
+    model = train_model('data/test', buffer_size=1)
+    empty_model = HMMModel()
+    empty_model = empty_model.update('data/test')
+    assert np.array_equal(empty_model.transition_counts, model.transition_counts)
+    assert np.array_equal(empty_model.second_order_counts, model.second_order_counts)
+
+def test_update_cached_model(tmp_path):
+    shutil.copy('data/test', str(tmp_path / 'train'))
+    model = get_model(str(tmp_path / 'train'), cache_dir=str(tmp_path / 'cache'))
+    counts = [np.array(model.emission_counts), np.array(model.transition_counts), np.array(model.second_order_counts)]
+
+    updated_model = get_model(str(tmp_path / 'train'), cache_dir=str(tmp_path / 'cache')).update('data/EN/train')
+    assert updated_model.emission_counts.sum() > counts[0].sum()
+
+    model = get_model(str(tmp_path / 'train'), cache_dir=str(tmp_path / 'cache'))
+    assert np.array_equal(model.emission_counts, counts[0])
+    assert np.array_equal(model.transition_counts, counts[1])
+    assert np.array_equal(model.second_order_counts, counts[2])
+    assert model.fingerprint() == train_model('data/test').fingerprint()
+    clear_model_cache()
@@ -1,5 +1,7 @@
-from part_2 import get_symbol_word_counts, get_emission_probabilities
-from part_3 import symbols, get_symbol_symbol_counts, get_transition_probabilities, get_observation_sequences, viterbi
+import numpy as np
+from part_2 import get_symbol_word_counts, get_emission_probabilities, emission_probability
+from part_3 import symbols, log, get_symbol_symbol_counts, get_transition_probabilities, get_observation_sequences, compile_emission_table, log_emission_scores, viterbi, batch_viterbi, decode_file, stream_decode_file, add_predicted_symbols_to_file, decode_and_evaluate, best_path, best_paths
+from evaluation import evaluate
 
 def test_get_symbol_symbol_counts():
     symbol_symbol_counts, symbol_counts = get_symbol_symbol_counts('data/test')
@@ -38,6 +40,26 @@ def test_get_transition_probabilities():
         assert transition_probabilities['I-positive'][symbol] == 0
         assert transition_probabilities['I-negative'][symbol] == 0
 
+def test_compile_emission_table():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_probabilities = get_emission_probabilities('data/test')
+    emission_table = compile_emission_table(emission_probabilities, symbol_counts)
+    word_ids, log_emissions = emission_table
+
+    assert sorted(word_ids) == ['A', 'B', 'C', 'D']
+    assert len(log_emissions) == len(word_ids) + 1
+
+    # Seen and unseen words score the same as emission_probability
+    words = ['A', 'B', 'C', 'D', 'U']
+    emission_scores = log_emission_scores(words, emission_table)
+    for k, word in enumerate(words):
+        for i, symbol in enumerate(symbols):
+            assert emission_scores[k][i] == log(emission_probability(symbol, word, emission_probabilities, symbol_counts))
+
+    # All unseen words share one row
+    assert (log_emission_scores(['U', 'V'], emission_table)[0] == log_emissions[-1]).all()
+    assert (log_emission_scores(['U', 'V'], emission_table)[1] == log_emissions[-1]).all()
+
 def test_get_observation_sequences():
     observation_sequences = get_observation_sequences('data/test_dev')
 
@@ -50,3 +72,38 @@ def test_viterbi():
     observation_sequences = get_observation_sequences('data/test_dev')
 
     assert viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences) == [['START', 'B-neutral', 'I-neutral', 'O', 'O', 'O', 'O', 'B-neutral', 'I-neutral', 'O', 'O', 'B-positive', 'O', 'STOP']]
+
+def test_batch_viterbi():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_probabilities = get_emission_probabilities('data/test')
+    transition_probabilities = get_transition_probabilities('data/test')
+    sequence = get_observation_sequences('data/test_dev')[0]
+    observation_sequences = [sequence, sequence[:1], sequence[3:8], ['U', 'A'], sequence[:2], sequence[5:]]
+
+    expected = viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)
+    for batch_size in [1, 2, 4, 256]:
+        assert batch_viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences, batch_size) == expected
+
+def test_stream_decode_file(tmp_path):
+    add_predicted_symbols_to_file(decode_file('data/EN/train', 'data/EN/dev.in'), 'data/EN/dev.in', tmp_path / 'dev.p3.out')
+    expected = (tmp_path / 'dev.p3.out').read_bytes()
+
+    for batch_size in [None, 1, 256]:
+        stream_decode_file('data/EN/train', 'data/EN/dev.in', tmp_path / 'stream.p3.out', batch_size)
+        assert (tmp_path / 'stream.p3.out').read_bytes() == expected
+
+def test_decode_and_evaluate(tmp_path):
+    for language in ['EN', 'CN']:
+        results = decode_and_evaluate('data/%s/train' % language, 'data/%s/dev.in' % language, 'data/%s/dev.out' % language, tmp_path / 'dev.p3.out')
+        assert results == evaluate('data/%s/dev.out' % language, tmp_path / 'dev.p3.out')
+        assert decode_and_evaluate('data/%s/train' % language, 'data/%s/dev.in' % language, 'data/%s/dev.out' % language) == results
+
+def test_best_path_many_symbols():
+    # More symbols than a signed byte can index
+    n_symbols = 300
+    transition_matrix = np.full((n_symbols + 1, n_symbols + 1), log(1 / (n_symbols + 1)))
+    emission_scores = np.full((3, n_symbols), log(0))
+    emission_scores[[0, 1, 2], [150, 160, 270]] = 0
+
+    assert best_path(emission_scores, transition_matrix) == [150, 160, 270]
+    assert best_paths(emission_scores[None], np.array([3]), transition_matrix).tolist() == [[150, 160, 270]]
@@ -0,0 +1,54 @@
+from itertools import product
+import numpy as np
+from part_2 import get_symbol_word_counts, get_emission_probabilities, emission_probability
+from part_3 import symbols, log, get_transition_probabilities, get_observation_sequences, viterbi
+from part_4 import top_m_viterbi, top_m_paths
+
+def path_score(transition_probabilities, emission_probabilities, symbol_counts, sequence, path):
+    score = 0
+    for k in range(1, len(path)):
+        score = score + log(transition_probabilities[path[k-1]][path[k]]) + log(emission_probability(path[k], sequence[k-1], emission_probabilities, symbol_counts))
+    return score + log(transition_probabilities[path[-1]]['STOP'])
+
+def all_path_scores(transition_probabilities, emission_probabilities, symbol_counts, sequence):
+    """
+    Scores every possible symbol sequence, best first
+    """
+
+    scores = [path_score(transition_probabilities, emission_probabilities, symbol_counts, sequence, ['START'] + list(path)) for path in product(symbols, repeat=len(sequence))]
+    return sorted(scores, reverse=True)
+
+def test_top_m_viterbi():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_probabilities = get_emission_probabilities('data/test')
+    transition_probabilities = get_transition_probabilities('data/test')
+    sequence = get_observation_sequences('data/test_dev')[0]
+    observation_sequences = [sequence[:1], sequence[:3], sequence[8:12], ['U', 'A', 'U']]
+
+    for m in [1, 5, 20, 400]:
+        top_m_paths = top_m_viterbi(m, transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)
+        for observation_sequence, top_m in zip(observation_sequences, top_m_paths):
+            expected = all_path_scores(transition_probabilities, emission_probabilities, symbol_counts, observation_sequence)[:m]
+            assert [score for score, path in top_m] == expected
+            assert len(set(tuple(path) for score, path in top_m)) == len(top_m)
+            for score, path in top_m:
+                assert score == path_score(transition_probabilities, emission_probabilities, symbol_counts, observation_sequence, path)
+
+def test_top_m_viterbi_best_path():
+    symbol_counts = get_symbol_word_counts('data/test')[1]
+    emission_probabilities = get_emission_probabilities('data/test')
+    transition_probabilities = get_transition_probabilities('data/test')
+    observation_sequences = get_observation_sequences('data/test_dev')
+
+    best_path = viterbi(transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)[0][:-1]
+    top_m_paths = top_m_viterbi(5, transition_probabilities, emission_probabilities, symbol_counts, observation_sequences)[0]
+    assert len(top_m_paths) == 5
+    assert top_m_paths[0][1] == best_path
+
+def test_top_m_paths_many_symbols():
+    n_symbols = 300
+    transition_matrix = np.full((n_symbols + 1, n_symbols + 1), log(1 / (n_symbols + 1)))
+    emission_scores = np.full((3, n_symbols), log(0))
+    emission_scores[[0, 1, 2], [150, 160, 270]] = 0
+
+    assert top_m_paths(2, emission_scores, transition_matrix)[0][1] == [150, 160, 270]
@@ -1,4 +1,27 @@
-from part_5 import symbols, get_symbol_word_counts, estimate_emission_params, get_symbol_symbol_symbol_counts, estimate_second_order_transition_params, get_second_order_transition_probabilities, get_observation_sequences, second_order_viterbi
+from itertools import product
+from part_5 import symbols, log, get_symbol_word_counts, estimate_emission_params, get_symbol_symbol_symbol_counts, estimate_second_order_transition_params, get_second_order_transition_probabilities, get_observation_sequences, compile_emission_table, log_emission_scores, compile_second_order_transition_tensor, second_order_best_path, second_order_viterbi, pre_process, find_sentence_shards, prune_beam, second_order_beam_path, beam_agreement, second_order_top_m_paths, second_order_top_m_decode_file, second_order_beam_viterbi, second_order_top_m_viterbi
+from part_4 import write_part_4_dev_out
+import numpy as np
+import shutil
+
+def second_order_path_scores(sequence, emission_table, transition_tensor):
+    """
+    Scores every possible path of a sequence under a second order model,
+    returns a dict from the tuples of symbol indices of the paths to their scores
+    """
+
+    START = STOP = len(symbols)
+    emission_scores = log_emission_scores(sequence, emission_table)
+    path_scores = {}
+    for path in product(range(len(symbols)), repeat=len(sequence)):
+        padded_path = [START, START] + list(path) + [STOP]
+        score = 0
+        for k in range(2, len(padded_path)):
+            score = score + transition_tensor[padded_path[k-2]][padded_path[k-1]][padded_path[k]]
+            if k < len(padded_path) - 1:
+                score = score + emission_scores[k-2][padded_path[k]]
+        path_scores[path] = score
+    return path_scores
 
 def test_get_symbol_symbol_symbol_counts():
     symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts('data/test')
@@ -47,6 +70,30 @@ def test_get_second_order_transition_probabilities():
         assert second_order_transition_probabilities['I-neutral']['B-negative'][symbol] == 0
         assert second_order_transition_probabilities['B-neutral']['B-negative'][symbol] == 0
 
+def test_compile_second_order_transition_tensor():
+    second_order_transition_probabilities = get_second_order_transition_probabilities('data/test')
+    transition_tensor = compile_second_order_transition_tensor(second_order_transition_probabilities)
+    START = STOP = len(symbols)
+
+    assert transition_tensor.shape == (8, 8, 8)
+    assert transition_tensor[START][symbols.index('B-neutral')][symbols.index('I-neutral')] == log(1)
+    assert transition_tensor[symbols.index('O')][symbols.index('O')][symbols.index('B-neutral')] == log(1.0/4)
+    assert transition_tensor[symbols.index('B-positive')][symbols.index('O')][STOP] == log(1)
+    assert transition_tensor[START][START][symbols.index('O')] == log(0)
+
+def test_second_order_best_path():
+    symbol_word_counts, symbol_counts = get_symbol_word_counts('data/test')
+    emission_table = compile_emission_table(estimate_emission_params(symbol_word_counts, symbol_counts), symbol_counts)
+    transition_tensor = compile_second_order_transition_tensor(get_second_order_transition_probabilities('data/test'))
+
+    for sequence in [['A'], ['A', 'B'], ['C', 'A', 'B'], ['B', 'U', 'C', 'D']]:
+        emission_scores = log_emission_scores(sequence, emission_table)
+        path_scores = second_order_path_scores(sequence, emission_table, transition_tensor)
+        # The first of the best paths in the order of product
+        best = max(path_scores, key=path_scores.get)
+
+        assert second_order_best_path(emission_scores, transition_tensor) == list(best)
+
 def test_second_order_viterbi():
     symbol_word_counts, symbol_counts = get_symbol_word_counts('data/test')
     emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
@@ -57,3 +104,109 @@ def test_second_order_viterbi():
     observation_sequences = get_observation_sequences('data/test_dev')
 
     assert second_order_viterbi(second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences) == [['START', 'B-neutral', 'I-neutral', 'O', 'O', 'O', 'O', 'B-neutral', 'I-neutral', 'O', 'O', 'B-positive', 'O', 'STOP']]
+
+def test_pre_process(tmp_path):
+    shutil.copy('data/EN/dev.in', tmp_path / 'dev.in')
+    expected = open('data/EN/dev.in_processed', 'rb').read()
+
+    for processes, shard_size in [(1, 1 << 24), (2, 1), (2, 10000)]:
+        pre_process(str(tmp_path / 'dev.in'), processes, shard_size)
+        assert open(str(tmp_path / 'dev.in_processed'), 'rb').read() == expected
+
+def test_find_sentence_shards():
+    shards = find_sentence_shards('data/EN/dev.in', 10000)
+    data = open('data/EN/dev.in', 'rb').read()
+
+    assert len(shards) > 1
+    assert shards[0][0] == 0 and shards[-1][1] == len(data)
+    for (start, end), (next_start, next_end) in zip(shards, shards[1:]):
+        assert end == next_start
+        assert data[:end].endswith(b'\n\n')
+
+def test_prune_beam():
+    scores = np.array([-3.0, -1.0, -2.0, -1.0, -9.0])
+
+    assert prune_beam(scores).tolist() == [0, 1, 2, 3, 4]
+    assert prune_beam(scores, beam_width=2).tolist() == [1, 3]
+    assert prune_beam(scores, beam_width=3).tolist() == [1, 2, 3]
+    assert prune_beam(scores, threshold=1.5).tolist() == [1, 2, 3]
+    assert prune_beam(scores, beam_width=2, threshold=0.5).tolist() == [1, 3]
+
+def test_second_order_beam_path():
+    rng = np.random.default_rng(0)
+    transition_tensor = np.log(rng.dirichlet(np.ones(8), size=(8, 8)))
+
+    for n in [1, 2, 3, 10]:
+        emission_scores = np.log(rng.dirichlet(np.ones(7), size=n))
+        best = second_order_best_path(emission_scores, transition_tensor)
+        # A beam holding every state is exact
+        assert second_order_beam_path(emission_scores, transition_tensor) == best
+        assert second_order_beam_path(emission_scores, transition_tensor, beam_width=49) == best
+        assert len(second_order_beam_path(emission_scores, transition_tensor, beam_width=1)) == n
+        assert len(second_order_beam_path(emission_scores, transition_tensor, threshold=1.0)) == n
+
+def test_beam_agreement():
+    agreement = beam_agreement('data/EN/train_processed', 'data/EN/dev.in_processed')
+    assert agreement['sequences'] == 470
+    assert agreement['sequence_agreement'] == agreement['symbol_agreement'] == 1
+
+    agreement = beam_agreement('data/EN/train_processed', 'data/EN/dev.in_processed', beam_width=2)
+    assert agreement['sequence_agreement'] < agreement['symbol_agreement'] < 1
+
+def test_second_order_top_m_paths():
+    symbol_word_counts, symbol_counts = get_symbol_word_counts('data/test')
+    emission_table = compile_emission_table(estimate_emission_params(symbol_word_counts, symbol_counts), symbol_counts)
+    transition_tensor = compile_second_order_transition_tensor(get_second_order_transition_probabilities('data/test'))
+
+    for sequence in [['A'], ['A', 'B'], ['C', 'A', 'B'], ['B', 'U', 'C', 'D']]:
+        emission_scores = log_emission_scores(sequence, emission_table)
+        path_scores = second_order_path_scores(sequence, emission_table, transition_tensor)
+        expected_scores = sorted(path_scores.values(), reverse=True)
+
+        for m in [1, 3, 10]:
+            top_m = second_order_top_m_paths(m, emission_scores, transition_tensor)
+            assert np.allclose([score for score, path in top_m], expected_scores[:m])
+            assert all(np.isclose(score, path_scores[tuple(path)]) for score, path in top_m)
+            assert len(set(tuple(path) for score, path in top_m)) == min(m, len(path_scores))
+        assert second_order_top_m_paths(1, emission_scores, transition_tensor)[0][1] == second_order_best_path(emission_scores, transition_tensor)
+
+def test_second_order_top_m_decode_file(tmp_path):
+    all_top_m_paths = second_order_top_m_decode_file(3, 'data/test', 'data/test_dev')
+
+    assert len(all_top_m_paths) == 1 and len(all_top_m_paths[0]) == 3
+    assert all(path[0] == 'START' and len(path) == 13 for score, path in all_top_m_paths[0])
+    write_part_4_dev_out(all_top_m_paths, 'data/test_dev', tmp_path / 'test_dev.out')
+    assert (tmp_path / 'test_dev.out').read_text(encoding='utf8').split('\n')[0] == 'A ' + all_top_m_paths[0][-1][1][1]
+
+def test_second_order_many_symbols():
+    n_symbols = 200
+    transition_tensor = np.full((n_symbols + 1,) * 3, log(1 / (n_symbols + 1)))
+    emission_scores = np.full((3, n_symbols), log(0))
+    emission_scores[[0, 1, 2], [150, 160, 170]] = 0
+
+    assert second_order_best_path(emission_scores, transition_tensor) == [150, 160, 170]
+    assert second_order_top_m_paths(2, emission_scores, transition_tensor)[0][1] == [150, 160, 170]
+
+def test_second_order_beam_viterbi():
+    symbol_word_counts, symbol_counts = get_symbol_word_counts('data/EN/train')
+    emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
+    symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts('data/EN/train')
+    second_order_transition_probabilities = estimate_second_order_transition_params(symbol_symbol_symbol_counts, symbol_symbol_counts)
+    observation_sequences = get_observation_sequences('data/EN/dev.in')[:20]
+
+    # The decoders take the same arguments
+    arguments = (second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences)
+    assert second_order_beam_viterbi(*arguments) == second_order_viterbi(*arguments)
+    assert all(len(symbols) == len(sequence) + 2 for symbols, sequence in zip(second_order_beam_viterbi(*arguments, beam_width=2), observation_sequences))
+
+def test_second_order_top_m_viterbi():
+    symbol_word_counts, symbol_counts = get_symbol_word_counts('data/test')
+    emission_probabilities = estimate_emission_params(symbol_word_counts, symbol_counts)
+    symbol_symbol_symbol_counts, symbol_symbol_counts = get_symbol_symbol_symbol_counts('data/test')
+    second_order_transition_probabilities = estimate_second_order_transition_params(symbol_symbol_symbol_counts, symbol_symbol_counts)
+    observation_sequences = get_observation_sequences('data/EN/dev.in')[:20]
+
+    # The best of the m paths is the path of second_order_viterbi, given the same arguments
+    arguments = (second_order_transition_probabilities, emission_probabilities, symbol_symbol_counts, symbol_counts, observation_sequences)
+    all_top_m_paths = second_order_top_m_viterbi(3, *arguments)
+    assert [top_m_paths[0][1] + ['STOP'] for top_m_paths in all_top_m_paths] == second_order_viterbi(*arguments)
@@ -0,0 +1,44 @@
+import os
+import pytest
+import pipeline
+from pipeline import Job, default_jobs, job_size, run_job, run_pipeline, main
+
+def test_default_jobs():
+    jobs = default_jobs()
+
+    assert len(jobs) == 12
+    assert len(set(job.output_file for job in jobs)) == len(jobs)
+    assert all(job.decode_in == job.dev_in for job in jobs if job.part == 'p3')
+    assert { job.output_file for job in jobs if job.part == 'p5' } == { 'output/EN/dev.p5.out', 'output/EN/test.p5.out', 'output/ES/dev.p5.out', 'output/ES/test.p5.out' }
+
+def test_run_job(tmp_path):
+    with pytest.raises(ValueError):
+        run_job(Job('test', 'p3', 'data/test', 'data/test_processed', 'data/test_dev', str(tmp_path / 'dev.p3.out')))
+    with pytest.raises(ValueError):
+        run_job(Job('test', 'p6', 'data/test', 'data/test_dev', 'data/test_dev', str(tmp_path / 'dev.p6.out')))
+
+def test_run_pipeline(tmp_path):
+    jobs = [
+        Job('test', 'p3', 'data/test', 'data/test_dev', 'data/test_dev', str(tmp_path / 'test' / 'dev.p3.out')),
+        Job('test', 'p4', 'data/test', 'data/test_dev', 'data/test_dev', str(tmp_path / 'test' / 'dev.p4.out')),
+        Job('EN', 'p5', 'data/EN/train', 'data/EN/dev.in', 'data/EN/dev.in', str(tmp_path / 'EN' / 'dev.p5.out')),
+    ]
+    timings = run_pipeline(jobs, workers=1, report=None)
+
+    # With one worker the jobs finish in the order they start, biggest first
+    assert [job for job, seconds in timings] == sorted(jobs, key=job_size, reverse=True)
+    assert all(seconds > 0 for job, seconds in timings)
+    for job in jobs:
+        assert os.path.getsize(job.output_file) > 0
+
+def test_main(monkeypatch):
+    runs = []
+    monkeypatch.setattr(pipeline, 'run_pipeline', lambda jobs, workers: runs.append((jobs, workers)))
+
+    main(['--languages', 'EN', 'SG', '--parts', 'p3', 'p5', '--workers', '3'])
+    jobs, workers = runs[-1]
+    assert workers == 3
+    assert [(job.language, job.part) for job in jobs] == [('EN', 'p3'), ('SG', 'p3'), ('EN', 'p5'), ('EN', 'p5')]
+
+    main([])
+    assert runs[-1] == (default_jobs(), None)
@@ -0,0 +1,24 @@
+import pytest
+from writer import write_word_symbol_pairs, write_sequences, write_predicted_symbols
+
+words = ['A', 'B', 'C', 'C', 'C', 'A', 'B', 'A', 'B', 'C', 'D', 'C']
+predicted_symbols = ['B-neutral', 'I-neutral', 'O', 'O', 'O', 'O', 'B-neutral', 'I-neutral', 'O', 'O', 'B-positive', 'O']
+expected = ''.join(word + ' ' + symbol + '\n' for word, symbol in zip(words, predicted_symbols)) + ' \n'
+
+def test_write_predicted_symbols(tmp_path):
+    for buffer_size in [1, 10, 1 << 20]:
+        write_predicted_symbols([predicted_symbols], 'data/test_dev', tmp_path / 'test_dev.out', buffer_size)
+        # data/test_dev does not end with a blank line, so there is no separator line
+        assert (tmp_path / 'test_dev.out').read_text(encoding='utf8') == expected[:-2]
+
+    with pytest.raises(ValueError):
+        write_predicted_symbols([predicted_symbols[:5]], 'data/test_dev', tmp_path / 'test_dev.out')
+
+def test_write_sequences(tmp_path):
+    for chunk_size in [1, 5, 1 << 14]:
+        write_sequences([(words, predicted_symbols), (words[:2], predicted_symbols[:2])], tmp_path / 'test_dev.out', chunk_size)
+        assert (tmp_path / 'test_dev.out').read_text(encoding='utf8') == expected + 'A B-neutral\nB I-neutral\n \n'
+
+def test_write_word_symbol_pairs(tmp_path):
+    write_word_symbol_pairs(list(zip(words, predicted_symbols)) + [('', '')], tmp_path / 'test_dev.out', 5)
+    assert (tmp_path / 'test_dev.out').read_text(encoding='utf8') == expected
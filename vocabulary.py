@@ -0,0 +1,78 @@
+class TagSet:
+    """
+    Interns a list of symbols to the integer ids 0 .. n-1.
+    The id n stands for START when it is the previous symbol
+    of a transition and for STOP when it is the next one,
+    which is how the transition arrays of the decoders are laid out
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.START = self.STOP = len(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __eq__(self, other):
+        return isinstance(other, TagSet) and self.symbols == other.symbols
+
+    def id(self, symbol):
+        """
+        Returns the id of a symbol, raising a KeyError for
+        symbols that are not in the tag set
+        """
+
+        if symbol == 'START':
+            return self.START
+        if symbol == 'STOP':
+            return self.STOP
+        return self.ids[symbol]
+
+    def decode(self, path):
+        """
+        Returns the symbols of a list of symbol ids
+        """
+
+        return [self.symbols[i] for i in path]
+
+class Vocabulary:
+    """
+    Interns words to the integer ids 0 .. n-1 in the order
+    they are first added. Unknown words get the id -1,
+    which indexes the shared unseen-word row of an emission table
+    """
+
+    def __init__(self, words=()):
+        self.words = list(words)
+        self.ids = dict(zip(self.words, range(len(self.words))))
+        if len(self.ids) != len(self.words):
+            raise ValueError("Vocabulary words must be distinct")
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def add(self, word):
+        """
+        Returns the id of a word, giving it a new id if it is unknown
+        """
+
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    def id(self, word):
+        return self.ids.get(word, -1)
+
+    def ids_of(self, sequence):
+        """
+        Returns the list of ids of a sequence of words
+        """
+
+        ids = self.ids
+        return [ids.get(word, -1) for word in sequence]
@@ -0,0 +1,50 @@
+from itertools import chain, islice
+
+def write_word_symbol_pairs(word_symbol_pairs, prediction_file, chunk_size=1 << 14):
+    """
+    Writes an iterable of (word, symbol) tuples to prediction_file
+    with lines like
+    (word) (symbol)
+    chunk_size lines at a time. Sequences are separated by ('', '') tuples,
+    which are written as a line with a single space
+    """
+
+    word_symbol_pairs = iter(word_symbol_pairs)
+    with open(prediction_file, "w", encoding="utf8") as result_file:
+        for chunk in iter(lambda: list(islice(word_symbol_pairs, chunk_size)), []):
+            result_file.writelines([word + " " + symbol + "\n" for word, symbol in chunk])
+
+def write_sequences(sequences_and_symbols, prediction_file, chunk_size=1 << 14):
+    """
+    Takes an iterable of (words, predicted symbols) tuples, one per sequence,
+    and writes them to prediction_file as they come,
+    in chunks of about chunk_size lines
+    """
+
+    with open(prediction_file, "w", encoding="utf8") as result_file:
+        lines = []
+        for sequence, sequence_symbols in sequences_and_symbols:
+            lines += [word + " " + symbol + "\n" for word, symbol in zip(sequence, sequence_symbols)]
+            lines.append(" \n")
+            if len(lines) >= chunk_size:
+                result_file.writelines(lines)
+                lines = []
+        result_file.writelines(lines)
+
+def write_predicted_symbols(predicted_symbols, dev_in, prediction_file, buffer_size=1 << 20):
+    """
+    Takes an iterable of the predicted symbols of every sequence of dev_in,
+    without START and STOP, and writes the words of dev_in with their symbols
+    to prediction_file, reading dev_in and the predictions together in one pass
+    of about buffer_size characters at a time
+    """
+
+    # One symbol per line of dev_in, with an empty one for the blank line after each sequence
+    symbols_list = chain.from_iterable(chain(sequence_symbols, [""]) for sequence_symbols in predicted_symbols)
+
+    with open(dev_in, encoding="utf8") as f, open(prediction_file, "w", encoding="utf8") as result_file:
+        for lines in iter(lambda: f.readlines(buffer_size), []):
+            chunk = list(islice(symbols_list, len(lines)))
+            if len(chunk) < len(lines):
+                raise ValueError("%s has more lines than there are predicted symbols" % dev_in)
+            result_file.writelines([line.strip() + " " + symbol + "\n" for line, symbol in zip(lines, chunk)])